@@ -1,79 +1,173 @@
 import sys
-import threading
 import os
 import json
-from datetime import datetime
-from http.server import BaseHTTPRequestHandler, HTTPServer, SimpleHTTPRequestHandler
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QHBoxLayout, QListWidget,
+    QApplication, QMainWindow, QWidget, QHBoxLayout, QListWidget, QListWidgetItem, QListView,
     QVBoxLayout, QPushButton, QLabel, QLineEdit, QMessageBox,
-    QDialog, QFormLayout, QDialogButtonBox, QComboBox, QFileDialog
+    QDialog, QFormLayout, QDialogButtonBox, QComboBox, QFileDialog, QCheckBox, QGroupBox, QProgressDialog
+)
+from PyQt6.QtCore import Qt, pyqtSignal, QObject, QAbstractListModel, QModelIndex, QTimer
+from servidores import (
+    DEFAULT_BACKLOG, DEFAULT_DRAIN_TIMEOUT, DEFAULT_ENGINE, DEFAULT_POOL_SIZE, ENGINES, create_server, server_config,
+    server_options
+)
+from busqueda import Query, SearchIndex, parse_time
+from eventos import as_event, decode_line, format_event
+from metricas import format_bytes, format_latency, percentile
+from registro import (
+    DEFAULT_MESSAGE_CAPACITY, DEFAULT_REFRESH_HZ, EventBatcher, LogWriter, RingBuffer, TransferCancelled,
+    export_log, import_tail, read_lines_backwards
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QObject
 
 CONFIG_FILE = "config.json"
 LOGS_DIR = "logs"
 
-# HANDLERS
-class CustomStaticHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, directory=None, **kwargs):
-        self._custom_directory = directory
-        super().__init__(*args, directory=directory, **kwargs)
+HISTORY_PAGE_SIZE = 500
+SEARCH_DEBOUNCE_MS = 250
+STATS_REFRESH_MS = 1000
+LIFECYCLE_WORKERS = 16
+TRANSFER_PROGRESS_STEPS = 1000
+TRANSFER_DIALOG_DELAY_MS = 300
 
-    def log_message(self, format, *args):
-        return
+class Communicate(QObject):
+    new_messages = pyqtSignal(list, dict)
+    search_done = pyqtSignal(int, object, object)
+    server_started = pyqtSignal(int, object, object)
+    server_stopped = pyqtSignal(int, object)
+    transfer_progress = pyqtSignal(int)
+    transfer_done = pyqtSignal(object, object, object)
 
-class CustomSimpleHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        response_text = f"Hola desde servidor en puerto {self.server.server_port}"
-        self.wfile.write(response_text.encode())
+class MessageListModel(QAbstractListModel):
+    # Filas = historial paginado desde disco + RingBuffer del puerto actual.
+    # Con un filtro activo, las filas son solo las coincidencias. Las filas son
+    # eventos: el texto se genera solo para las que se pintan.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._buffer = RingBuffer(1)
+        self._locate_history = None
+        self._history = []
+        self._history_path = None
+        self._history_offset = None
+        self._filtered = None
 
-        if hasattr(self.server, 'callback'):
-            message = f"GET {self.path} desde {self.client_address[0]}:{self.client_address[1]}"
-            self.server.callback(message)
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._filtered is not None:
+            return len(self._filtered)
+        return len(self._history) + len(self._buffer)
 
-    def log_message(self, format, *args):
-        return
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        if self._filtered is not None:
+            return format_event(self._filtered[row])
+        if row < len(self._history):
+            return format_event(self._history[row])
+        return format_event(self._buffer[row - len(self._history)])
 
-class HttpServerThread(threading.Thread):
-    def __init__(self, port, message_callback, server_name, mode, static_dir=None):
-        super().__init__()
-        self.port = port
-        self.message_callback = message_callback
-        self.server_name = server_name
-        self.mode = mode
-        self.static_dir = static_dir
-
-        if mode == "static":
-            handler_class = lambda *args, **kwargs: CustomStaticHandler(*args, directory=static_dir, **kwargs)
-        else:
-            handler_class = CustomSimpleHandler
+    def set_source(self, buffer, locate_history=None):
+        self.beginResetModel()
+        self._buffer = buffer if buffer is not None else RingBuffer(1)
+        self._locate_history = locate_history
+        self._history = []
+        self._history_path = None
+        self._history_offset = None
+        self._filtered = None
+        self.endResetModel()
 
-        self.httpd = HTTPServer(('0.0.0.0', port), handler_class)
-        self.httpd.callback = message_callback
-        self.httpd.server_name = server_name
-        self.daemon = True
+    def reset(self):
+        self.set_source(self._buffer, self._locate_history)
 
-    def run(self):
-        try:
-            self.httpd.serve_forever()
-        except Exception:
-            pass
+    def append(self, lines):
+        buffer = self._buffer
+        if self._filtered is not None:
+            buffer.extend(lines)
+            return
+        if len(lines) >= buffer.capacity:
+            self.beginResetModel()
+            buffer.extend(lines)
+            self._history = []
+            self._history_offset = None
+            self.endResetModel()
+            return
+        evicted = max(0, len(buffer) + len(lines) - buffer.capacity)
+        if evicted and self._history_offset is not None:
+            # Las filas que salen del buffer pasan al historial: los índices no cambian
+            self._history.extend(buffer[i] for i in range(evicted))
+            buffer.drop_oldest(evicted)
+            if len(self._history) > buffer.capacity:
+                drop = len(self._history) - buffer.capacity
+                self.beginRemoveRows(QModelIndex(), 0, drop - 1)
+                del self._history[:drop]
+                self._history_offset = 0
+                self.endRemoveRows()
+        elif evicted:
+            first = len(self._history)
+            self.beginRemoveRows(QModelIndex(), first, first + evicted - 1)
+            buffer.drop_oldest(evicted)
+            self.endRemoveRows()
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(lines) - 1)
+        buffer.extend(lines)
+        self.endInsertRows()
 
-    def stop(self):
-        self.httpd.shutdown()
+    def set_filtered(self, rows):
+        self.beginResetModel()
+        self._filtered = rows[-self._buffer.capacity:] if rows is not None else None
+        self.endResetModel()
 
-class Communicate(QObject):
-    new_message = pyqtSignal(str, int, str)
+    def append_filtered(self, rows):
+        if self._filtered is None or not rows:
+            return
+        drop = max(0, len(self._filtered) + len(rows) - self._buffer.capacity)
+        if drop:
+            drop = min(drop, len(self._filtered))
+            self.beginRemoveRows(QModelIndex(), 0, drop - 1)
+            del self._filtered[:drop]
+            self.endRemoveRows()
+        rows = rows[-self._buffer.capacity:]
+        first = len(self._filtered)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._filtered.extend(rows)
+        self.endInsertRows()
+
+    def can_load_older(self):
+        if self._filtered is not None or self._locate_history is None:
+            return False
+        if len(self._history) >= self._buffer.capacity:
+            return False
+        return self._history_offset is None or self._history_offset > 0
+
+    def load_older(self, count=HISTORY_PAGE_SIZE):
+        if not self.can_load_older():
+            return 0
+        if self._history_offset is None:
+            path, end, skip = self._locate_history()
+            if path is None or not os.path.exists(path):
+                self._history_offset = 0
+                return 0
+            _, end = read_lines_backwards(path, end, skip)
+            self._history_path = path
+            self._history_offset = end
+        count = min(count, self._buffer.capacity - len(self._history))
+        lines, self._history_offset = read_lines_backwards(self._history_path, self._history_offset, count)
+        events = [event for event in map(decode_line, lines) if event is not None]
+        if events:
+            self.beginInsertRows(QModelIndex(), 0, len(events) - 1)
+            self._history[:0] = events
+            self.endInsertRows()
+        return len(events)
 
 class NewServerDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Nuevo Servidor HTTP")
-        self.setFixedSize(400, 200)
+        self.setFixedSize(400, 400)
 
         layout = QFormLayout(self)
         self.name_input = QLineEdit()
@@ -93,8 +187,37 @@ class NewServerDialog(QDialog):
         self.dir_label = QLabel("<ninguna>")
         layout.addRow("Carpeta raíz:", self.dir_label)
 
+        self.concurrency_combo = QComboBox()
+        self.concurrency_combo.addItems(["Un hilo por conexión", "Pool de hilos fijo"])
+        layout.addRow("Concurrencia:", self.concurrency_combo)
+
+        self.pool_size_input = QLineEdit(str(DEFAULT_POOL_SIZE))
+        self.pool_size_input.setEnabled(False)
+        layout.addRow("Hilos del pool:", self.pool_size_input)
+
+        self.backlog_input = QLineEdit(str(DEFAULT_BACKLOG))
+        layout.addRow("Cola de conexiones:", self.backlog_input)
+
+        self.processes_input = QLineEdit("1")
+        layout.addRow("Procesos (SO_REUSEPORT):", self.processes_input)
+
+        self.keepalive_check = QCheckBox("HTTP/1.1 con conexiones persistentes")
+        layout.addRow(self.keepalive_check)
+
+        self.ingest_check = QCheckBox("Guardar datos POST/PUT en data_<puerto>")
+        layout.addRow(self.ingest_check)
+
+        self.ingest_format_combo = QComboBox()
+        self.ingest_format_combo.addItems(["JSON Lines", "Binario con longitud"])
+        self.ingest_format_combo.setEnabled(False)
+        layout.addRow("Formato de datos:", self.ingest_format_combo)
+
+        self.ingest_check.toggled.connect(self.ingest_format_combo.setEnabled)
         self.dir_button.clicked.connect(self.select_directory)
         self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        self.concurrency_combo.currentIndexChanged.connect(
+            lambda index: self.pool_size_input.setEnabled(index == 1)
+        )
 
         buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         buttons.accepted.connect(self.accept)
@@ -105,6 +228,10 @@ class NewServerDialog(QDialog):
 
     def on_mode_changed(self, index):
         self.dir_button.setEnabled(index == 1)
+        # Los datos POST/PUT solo se reciben en el modo simple
+        self.ingest_check.setEnabled(index != 1)
+        if index == 1:
+            self.ingest_check.setChecked(False)
         if index != 1:
             self.static_dir = None
             self.dir_label.setText("<ninguna>")
@@ -120,9 +247,56 @@ class NewServerDialog(QDialog):
             'name': self.name_input.text().strip(),
             'port': self.port_input.text().strip(),
             'mode': "static" if self.mode_combo.currentIndex() == 1 else "simple",
-            'static_dir': self.static_dir
+            'static_dir': self.static_dir,
+            'concurrency': "pool" if self.concurrency_combo.currentIndex() == 1 else "threads",
+            'pool_size': self.pool_size_input.text().strip(),
+            'backlog': self.backlog_input.text().strip(),
+            'processes': self.processes_input.text().strip(),
+            'keepalive': self.keepalive_check.isChecked(),
+            'ingest': self.ingest_check.isChecked(),
+            'ingest_format': "binary" if self.ingest_format_combo.currentIndex() == 1 else "jsonl"
         }
 
+class ExportDialog(QDialog):
+    def __init__(self, query_text=""):
+        super().__init__()
+        self.setWindowTitle("Exportar logs")
+        self.setFixedSize(420, 200)
+
+        layout = QFormLayout(self)
+        self.query_input = QLineEdit(query_text)
+        self.query_input.setPlaceholderText("ip:10.0.0.5 method:GET path:/api")
+        layout.addRow("Filtro:", self.query_input)
+
+        self.since_input = QLineEdit()
+        self.since_input.setPlaceholderText("2024-05-01T10:00 o -1h")
+        layout.addRow("Desde:", self.since_input)
+
+        self.until_input = QLineEdit()
+        self.until_input.setPlaceholderText("2024-05-01 o 18:00")
+        layout.addRow("Hasta:", self.until_input)
+
+        self.gzip_check = QCheckBox("Comprimir con gzip")
+        layout.addRow(self.gzip_check)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def get_query(self):
+        # Filtro y rango de fechas en una sola consulta; None si no hay filtro
+        query = Query.parse(self.query_input.text().strip())
+        since = self.since_input.text().strip()
+        if since:
+            value = parse_time(since)
+            query.since = value if query.since is None else max(query.since, value)
+        until = self.until_input.text().strip()
+        if until:
+            value = parse_time(until, upper=True)
+            query.until = value if query.until is None else min(query.until, value)
+        return None if query.is_empty() else query
+
 # MAIN APP
 class ServerManagerApp(QMainWindow):
     def __init__(self):
@@ -131,12 +305,43 @@ class ServerManagerApp(QMainWindow):
         self.resize(950, 550)
 
         os.makedirs(LOGS_DIR, exist_ok=True)
+        self.log_writer = LogWriter(LOGS_DIR)
         self.comm = Communicate()
-        self.comm.new_message.connect(self.add_message)
+        self.comm.new_messages.connect(self.add_messages)
+        self.refresh_hz = DEFAULT_REFRESH_HZ
+        self.comm.search_done.connect(self.on_search_done)
+        self.batcher = EventBatcher(self._index_batch, 1.0 / self.refresh_hz)
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.comm.server_started.connect(self.on_server_started)
+        self.comm.server_stopped.connect(self.on_server_stopped)
+        # Arranques, paradas y reinicios: en paralelo y fuera del hilo de la interfaz
+        self.lifecycle_executor = ThreadPoolExecutor(max_workers=LIFECYCLE_WORKERS, thread_name_prefix="lifecycle")
+        self.comm.transfer_progress.connect(self.on_transfer_progress)
+        self.comm.transfer_done.connect(self.on_transfer_done)
+        self.transfer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transfer")
+        self.transfer_cancel = None
+        self.progress_dialog = None
+        self.starting = {}
+        self.stopping = {}
+        # Puerto -> servidor antiguo de un reinicio en curso
+        self.restarting = {}
+        self.unstarted = {}
+        self.startup_errors = []
+        self.closing = False
 
+        self.engine = DEFAULT_ENGINE
+        self.drain_timeout = DEFAULT_DRAIN_TIMEOUT
+        self.message_capacity = DEFAULT_MESSAGE_CAPACITY
         self.servers = {}
         self.messages = {}
+        self.delivered = {}
+        self.search_indexes = {}
+        self.indexed_upto = {}
+        self.active_query = None
+        self.search_generation = 0
+        self.imported_logs = {}
         self.port_to_name = {}
+        self.server_items = {}
 
         central = QWidget()
         self.setCentralWidget(central)
@@ -159,6 +364,14 @@ class ServerManagerApp(QMainWindow):
         self.close_button.clicked.connect(self.close_selected_server)
         left_panel.addWidget(self.close_button)
 
+        self.restart_button = QPushButton("Reiniciar servidor seleccionado")
+        self.restart_button.clicked.connect(self.restart_selected_server)
+        left_panel.addWidget(self.restart_button)
+
+        self.reload_routes_button = QPushButton("Recargar rutas")
+        self.reload_routes_button.clicked.connect(self.reload_routes)
+        left_panel.addWidget(self.reload_routes_button)
+
         # NUEVOS BOTONES DE LOGS
         self.export_logs_button = QPushButton("Exportar logs")
         self.export_logs_button.clicked.connect(self.export_logs)
@@ -183,12 +396,39 @@ class ServerManagerApp(QMainWindow):
         right_panel.addWidget(self.messages_label)
 
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Buscar mensaje...")
-        self.search_input.textChanged.connect(self.filter_messages)
+        self.search_input.setPlaceholderText("Buscar mensaje... (ip:10.0.0.5 path:/api since:-1h)")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_messages)
+        self.search_input.textChanged.connect(self.search_timer.start)
         right_panel.addWidget(self.search_input)
 
-        self.messages_list = QListWidget()
-        right_panel.addWidget(self.messages_list)
+        self.search_status = QLabel("")
+        right_panel.addWidget(self.search_status)
+
+        self.messages_model = MessageListModel(self)
+        self.messages_list = QListView()
+        self.messages_list.setUniformItemSizes(True)
+        self.messages_list.setModel(self.messages_model)
+        self.messages_list.verticalScrollBar().valueChanged.connect(self.on_messages_scrolled)
+
+        # PANEL DE ESTADÍSTICAS
+        stats_box = QGroupBox("Estadísticas")
+        stats_layout = QVBoxLayout(stats_box)
+        self.stats_label = QLabel("")
+        self.stats_label.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        stats_layout.addWidget(self.stats_label)
+        self.last_stats = None
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_REFRESH_MS)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start()
+
+        messages_row = QHBoxLayout()
+        messages_row.addWidget(self.messages_list, 3)
+        messages_row.addWidget(stats_box, 1)
+        right_panel.addLayout(messages_row)
 
         self.current_port = None
 
@@ -202,45 +442,145 @@ class ServerManagerApp(QMainWindow):
             port_text = data['port']
             mode = data['mode']
             static_dir = data['static_dir']
+            concurrency = data['concurrency']
 
             if not name or not port_text.isdigit():
                 QMessageBox.warning(self, "Error", "Nombre o puerto inválido.")
                 return
+            if not data['pool_size'].isdigit() or int(data['pool_size']) < 1 or not data['backlog'].isdigit():
+                QMessageBox.warning(self, "Error", "Tamaño de pool o cola de conexiones inválido.")
+                return
+            if not data['processes'].isdigit() or int(data['processes']) < 1:
+                QMessageBox.warning(self, "Error", "Número de procesos inválido.")
+                return
             port = int(port_text)
-            if port in self.servers:
+            pool_size = int(data['pool_size'])
+            backlog = int(data['backlog'])
+            if port in self.servers or port in self.starting or port in self.stopping:
                 QMessageBox.warning(self, "Error", f"Ya hay un servidor en puerto {port}.")
                 return
             if mode == "static" and not static_dir:
                 QMessageBox.warning(self, "Error", "Seleccione una carpeta raíz.")
                 return
 
-            try:
-                server_thread = HttpServerThread(
-                    port,
-                    lambda msg: self.comm.new_message.emit(msg, port, name),
-                    name,
-                    mode,
-                    static_dir
-                )
-                server_thread.start()
-                self.servers[port] = server_thread
-                self.messages[port] = []
-                self.port_to_name[port] = name
-                self.servers_list.addItem(f"{name} (Puerto: {port})")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudo abrir el servidor:\n{e}")
+            self._submit_start({
+                "name": name,
+                "port": port,
+                "mode": mode,
+                "static_dir": static_dir,
+                "concurrency": concurrency,
+                "pool_size": pool_size,
+                "backlog": backlog,
+                "keepalive": {"enabled": data['keepalive']},
+                "ingest": {"enabled": data['ingest'], "format": data['ingest_format']},
+                "processes": int(data['processes']),
+            })
+
+    def register_server(self, port, name, server_thread):
+        self.servers[port] = server_thread
+        # Tras un reinicio se conservan los mensajes del puerto
+        if port not in self.messages:
+            self.messages[port] = RingBuffer(self.message_capacity)
+            self.delivered[port] = 0
+            self.search_indexes[port] = SearchIndex(self.message_capacity)
+            self.indexed_upto[port] = 0
+        self.port_to_name[port] = name
+        self._set_server_item(port, name)
+        if port == self.current_port:
+            self.on_server_selected()
+
+    def _set_server_item(self, port, name, status=None, tooltip=None):
+        # Una fila por puerto; el puerto va en los datos de la fila, no en el texto
+        item = self.server_items.get(port)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, port)
+            self.servers_list.addItem(item)
+            self.server_items[port] = item
+        item.setText(f"{name} (Puerto: {port})" + (f" - {status}" if status else ""))
+        item.setToolTip(tooltip or "")
+
+    def _remove_server_item(self, port):
+        item = self.server_items.pop(port, None)
+        if item is not None:
+            self.servers_list.takeItem(self.servers_list.row(item))
 
-    def add_message(self, message, port, name):
-        # Añadir fecha y hora al mensaje
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        full_message = f"[{timestamp}] {message}"
+    def _forget_server(self, port):
+        # Estado de un puerto en la interfaz: mensajes, índice y nombre
+        self.servers.pop(port, None)
+        self.messages.pop(port, None)
+        self.delivered.pop(port, None)
+        self.search_indexes.pop(port, None)
+        self.indexed_upto.pop(port, None)
+        self.imported_logs.pop(port, None)
+        self.port_to_name.pop(port, None)
 
-        self.messages[port].append(full_message)
-        log_path = os.path.join(LOGS_DIR, f"servidor_{port}.log")
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(full_message + "\n")
-        if self.current_port == port:
-            self.filter_messages()
+    def _deselect_server(self):
+        self.servers_list.setCurrentItem(None)
+        self.search_input.clear()
+        self.on_server_selected()
+
+    def on_request(self, port, message):
+        # Se ejecuta en el hilo del servidor: el evento va tal cual al log y a
+        # la interfaz, que lo recibe agrupado desde el EventBatcher
+        event = as_event(port, message)
+        self.log_writer.write(port, event)
+        self.batcher.add((port, event))
+
+    def _index_batch(self, batch):
+        # Hilo del EventBatcher: se indexa el lote antes de entregarlo a la interfaz
+        by_port = {}
+        for port, message in batch:
+            by_port.setdefault(port, []).append(message)
+        indexed = {}
+        for port, lines in by_port.items():
+            index = self.search_indexes.get(port)
+            if index is not None:
+                indexed[port] = index.add_many(lines)
+        self.comm.new_messages.emit(batch, indexed)
+
+    def add_messages(self, batch, indexed):
+        by_port = {}
+        for port, message in batch:
+            if port in self.messages:
+                by_port.setdefault(port, []).append(message)
+        for port, lines in by_port.items():
+            self.delivered[port] += len(lines)
+            if port in indexed:
+                self.indexed_upto[port] = indexed[port]
+            if port == self.current_port:
+                self.messages_model.append(lines)
+                if self.active_query is not None:
+                    self.messages_model.append_filtered([msg for msg in lines if self.active_query.matches(msg)])
+            else:
+                self.messages[port].extend(lines)
+
+    def on_messages_scrolled(self, value):
+        if value != self.messages_list.verticalScrollBar().minimum() or not self.messages_model.can_load_older():
+            return
+        loaded = self.messages_model.load_older()
+        if loaded:
+            self.messages_list.scrollTo(self.messages_model.index(loaded, 0), QListView.ScrollHint.PositionAtTop)
+
+    def _locate_history(self, port):
+        # Dónde termina en disco la parte del log que no está ya en memoria
+        buffer = self.messages[port]
+        imported = self.imported_logs.get(port)
+        if imported is not None:
+            path, delivered_at_import = imported
+            live = min(len(buffer), self.delivered[port] - delivered_at_import)
+            return path, os.path.getsize(path), len(buffer) - live
+        path, size, flushed = self.log_writer.snapshot(port)
+        return path, size, len(buffer) + max(0, flushed - self.delivered[port])
+
+    def show_port_messages(self, port):
+        if port not in self.messages:
+            self.messages_model.set_source(None)
+            return
+        self.messages_model.set_source(self.messages[port], lambda: self._locate_history(port))
+        self.messages_model.load_older()
+        self.filter_messages()
+        self.messages_list.scrollToBottom()
 
     def on_server_selected(self):
         selected = self.servers_list.currentItem()
@@ -250,65 +590,227 @@ class ServerManagerApp(QMainWindow):
             self.clear_logs_button.setEnabled(False)
             self.load_logs_button.setEnabled(False)
             self.messages_label.setText("Selecciona un servidor para ver mensajes")
-            self.messages_list.clear()
+            self.messages_model.set_source(None)
             return
-        try:
-            port = int(selected.text().split("Puerto:")[1].strip(" )"))
-        except Exception:
-            port = None
+        port = selected.data(Qt.ItemDataRole.UserRole)
 
         self.current_port = port
-        self.export_logs_button.setEnabled(True)
-        self.clear_logs_button.setEnabled(True)
-        self.load_logs_button.setEnabled(True)
+        running = port in self.servers
+        self.export_logs_button.setEnabled(running)
+        self.clear_logs_button.setEnabled(running)
+        self.load_logs_button.setEnabled(running)
         self.messages_label.setText(f"Mensajes del servidor {self.port_to_name.get(port,'')} (Puerto {port})")
-        self.filter_messages()
+        self.show_port_messages(port)
+        self.update_stats()
+
+    def update_stats(self):
+        server = self.servers.get(self.current_port)
+        if server is None:
+            self.last_stats = None
+            self.stats_label.setText("Sin servidor seleccionado")
+            return
+        snapshot = server.metrics.snapshot()
+        now = time.monotonic()
+        rps = None
+        if self.last_stats is not None and self.last_stats[0] == self.current_port:
+            _, then, requests = self.last_stats
+            rps = (snapshot["requests"] - requests) / max(now - then, 1e-6)
+        self.last_stats = (self.current_port, now, snapshot["requests"])
+
+        buckets = snapshot["buckets"]
+        statuses = ", ".join(f"{code}: {count}" for code, count in sorted(snapshot["statuses"].items()))
+        lines = [
+            f"Peticiones/s: {'-' if rps is None else f'{rps:.1f}'}",
+            f"Peticiones: {snapshot['requests']}",
+            f"Códigos: {statuses or '-'}",
+            "Latencia (ms):",
+            f"  p50 {format_latency(percentile(buckets, 0.50))}",
+            f"  p95 {format_latency(percentile(buckets, 0.95))}",
+            f"  p99 {format_latency(percentile(buckets, 0.99))}",
+            f"Enviado: {format_bytes(snapshot['bytes_sent'])}",
+            f"Conexiones activas: {snapshot['in_flight']}",
+        ]
+        cache = server.cache_stats()
+        if cache and "hits" in cache:
+            lines.append(f"Caché: {cache['hits']} aciertos, {cache['misses']} fallos")
+        self.stats_label.setText("\n".join(lines))
 
     def filter_messages(self):
-        if self.current_port is None:
-            self.messages_list.clear()
+        self.search_timer.stop()
+        self.search_generation += 1
+        if self.current_port not in self.messages:
+            self.active_query = None
+            self.search_status.clear()
+            self.messages_model.set_source(None)
+            return
+        text = self.search_input.text().strip()
+        if not text:
+            self.active_query = None
+            self.search_status.clear()
+            self.messages_model.set_filtered(None)
             return
-        search = self.search_input.text().lower()
-        self.messages_list.clear()
-        for msg in self.messages[self.current_port]:
-            if search in msg.lower():
-                self.messages_list.addItem(msg)
+        try:
+            query = Query.parse(text)
+        except ValueError as e:
+            self.search_status.setText(f"Consulta inválida: {e}")
+            return
+        self.active_query = query
+        self.messages_model.set_filtered([])
+        self.search_status.setText("Buscando...")
+        self.search_executor.submit(
+            self._run_search, self.search_generation, self.search_indexes[self.current_port], query
+        )
+
+    def _run_search(self, generation, index, query):
+        start = time.perf_counter()
+        messages, next_seq = index.query(query)
+        self.comm.search_done.emit(generation, query, (messages, next_seq, time.perf_counter() - start))
+
+    def on_search_done(self, generation, query, result):
+        if generation != self.search_generation or self.current_port not in self.search_indexes:
+            return
+        messages, next_seq, elapsed = result
+        # Lo entregado a la interfaz mientras se buscaba ya no está en el resultado
+        index = self.search_indexes[self.current_port]
+        delivered = index.between(next_seq, self.indexed_upto[self.current_port])
+        messages.extend(msg for msg in delivered if query.matches(msg))
+        self.messages_model.set_filtered(messages)
+        self.search_status.setText(f"{len(messages)} resultados ({elapsed * 1000:.1f} ms)")
 
     def close_selected_server(self):
         if self.current_port is None:
             QMessageBox.warning(self, "Error", "Seleccione un servidor primero.")
             return
-        thread = self.servers.get(self.current_port)
-        if thread:
-            thread.stop()
-            thread.join()
-            del self.servers[self.current_port]
-            del self.messages[self.current_port]
-            del self.port_to_name[self.current_port]
-            self.current_port = None
-            self.servers_list.clear()
-            self.messages_list.clear()
-            self.search_input.clear()
-            self.load_config()
+        port = self.current_port
+        server = self.servers.get(port)
+        if server is not None:
+            # La parada, con su plazo para las peticiones en curso, va en segundo
+            # plano; mientras tanto solo cambia la fila de este servidor
+            name = self.port_to_name.get(port, "")
+            self._forget_server(port)
+            self.stopping[port] = (name, server)
+            self._set_server_item(port, name, "cerrando...")
+            self._deselect_server()
+            self.lifecycle_executor.submit(self._stop_server, port, server, self.drain_timeout)
+        elif port in self.stopping:
+            QMessageBox.warning(self, "Error", "El servidor ya se está cerrando.")
+        elif port in self.server_items and port not in self.starting:
+            # Fila de un servidor que no llegó a arrancar
+            self.unstarted.pop(port, None)
+            self._forget_server(port)
+            self._remove_server_item(port)
+            self._deselect_server()
         else:
             QMessageBox.warning(self, "Error", "Servidor no encontrado.")
 
+    def restart_selected_server(self):
+        server = self.servers.get(self.current_port)
+        if server is None:
+            QMessageBox.warning(self, "Error", "Seleccione un servidor en marcha.")
+            return
+        port = self.current_port
+        srv = server_config(server)
+        del self.servers[port]
+        self.restarting[port] = server
+        # Si no vuelve a arrancar, su entrada se conserva en config.json
+        self.starting[port] = srv["name"]
+        self.unstarted[port] = srv
+        self._set_server_item(port, srv["name"], "reiniciando...")
+        self.on_server_selected()
+        self.lifecycle_executor.submit(self._restart_server, self.engine, server, srv, self.drain_timeout)
+
+    def _stop_server(self, port, server, timeout):
+        try:
+            server.stop(timeout)
+            server.join(timeout)
+        except Exception as e:
+            self.comm.server_stopped.emit(port, e)
+            return
+        self.comm.server_stopped.emit(port, None)
+
+    def _restart_server(self, engine, server, srv, timeout):
+        try:
+            server.stop(timeout)
+            server.join(timeout)
+        except Exception as e:
+            self.comm.server_started.emit(srv["port"], None, e)
+            return
+        self._start_server(engine, srv)
+
+    def on_server_stopped(self, port, error):
+        entry = self.stopping.pop(port, None)
+        if entry is None or self.closing:
+            return
+        self._remove_server_item(port)
+        if error is not None:
+            QMessageBox.warning(self, "Error", f"El servidor {entry[0]} (puerto {port}) no se cerró limpiamente:\n{error}")
+
+    def reload_routes(self):
+        # Aplica las rutas de config.json a los servidores en marcha sin reiniciarlos
+        try:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", f"No se pudo leer la configuración:\n{e}")
+            return
+        reloaded = 0
+        errors = []
+        for srv in data.get("servers", []):
+            server = self.servers.get(srv.get("port", 0))
+            if server is None:
+                continue
+            try:
+                server.set_routes(srv.get("routes") or [])
+            except (TypeError, ValueError) as e:
+                errors.append(f"{server.server_name} (puerto {server.port}): {e}")
+            else:
+                reloaded += 1
+        if errors:
+            QMessageBox.warning(self, "Error", "Rutas inválidas; se mantienen las anteriores:\n" + "\n".join(errors))
+        else:
+            QMessageBox.information(self, "Éxito", f"Rutas recargadas en {reloaded} servidores.")
+
     def export_logs(self):
         if self.current_port is None:
             QMessageBox.warning(self, "Error", "Seleccione un servidor primero.")
             return
-        log_path = os.path.join(LOGS_DIR, f"servidor_{self.current_port}.log")
+        if self.transfer_cancel is not None:
+            QMessageBox.warning(self, "Error", "Ya hay una exportación o importación en curso.")
+            return
+        self.log_writer.flush(self.current_port)
+        log_path = self.log_writer.log_path(self.current_port)
         if not os.path.exists(log_path):
             QMessageBox.information(self, "Información", "No hay logs para exportar.")
             return
-        save_path, _ = QFileDialog.getSaveFileName(self, "Guardar logs como", f"servidor_{self.current_port}.log", "Archivos de texto (*.log *.txt)")
-        if save_path:
-            try:
-                with open(log_path, "r", encoding="utf-8") as fsrc, open(save_path, "w", encoding="utf-8") as fdst:
-                    fdst.write(fsrc.read())
-                QMessageBox.information(self, "Éxito", "Logs exportados correctamente.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudo exportar logs:\n{e}")
+        dlg = ExportDialog(self.search_input.text().strip())
+        if dlg.exec() != QDialog.DialogCode.Accepted:
+            return
+        try:
+            query = dlg.get_query()
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", f"Filtro inválido:\n{e}")
+            return
+        compress = dlg.gzip_check.isChecked()
+        suggested = f"servidor_{self.current_port}.log" + (".gz" if compress else "")
+        save_path, _ = QFileDialog.getSaveFileName(self, "Guardar logs como", suggested, "Archivos de texto (*.log *.txt *.gz)")
+        if not save_path:
+            return
+        if compress and not save_path.endswith(".gz"):
+            save_path += ".gz"
+        # El log en disco es JSONL: se exporta como texto por bloques en segundo plano
+        self._start_transfer(
+            "Exportando logs...",
+            lambda progress, cancelled: export_log(log_path, save_path, query, compress, progress, cancelled),
+            self.on_export_done,
+        )
+
+    def on_export_done(self, exported, error):
+        if isinstance(error, TransferCancelled):
+            return
+        if error is not None:
+            QMessageBox.critical(self, "Error", f"No se pudo exportar logs:\n{error}")
+            return
+        QMessageBox.information(self, "Éxito", f"Logs exportados correctamente ({exported} eventos).")
 
     def clear_logs(self):
         if self.current_port is None:
@@ -316,11 +818,14 @@ class ServerManagerApp(QMainWindow):
             return
         reply = QMessageBox.question(self, "Confirmar", "¿Seguro que quieres limpiar los logs? Esto no se puede deshacer.", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            log_path = os.path.join(LOGS_DIR, f"servidor_{self.current_port}.log")
             try:
-                open(log_path, "w", encoding="utf-8").close()
+                self.log_writer.truncate(self.current_port)
                 self.messages[self.current_port].clear()
-                self.filter_messages()
+                self.delivered[self.current_port] = 0
+                self.search_indexes[self.current_port].clear()
+                self.indexed_upto[self.current_port] = 0
+                self.imported_logs.pop(self.current_port, None)
+                self.show_port_messages(self.current_port)
                 QMessageBox.information(self, "Éxito", "Logs limpiados correctamente.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudieron limpiar los logs:\n{e}")
@@ -329,28 +834,92 @@ class ServerManagerApp(QMainWindow):
         if self.current_port is None:
             QMessageBox.warning(self, "Error", "Seleccione un servidor primero.")
             return
-        file_path, _ = QFileDialog.getOpenFileName(self, "Seleccionar archivo de logs", "", "Archivos de texto (*.log *.txt)")
+        if self.transfer_cancel is not None:
+            QMessageBox.warning(self, "Error", "Ya hay una exportación o importación en curso.")
+            return
+        file_path, _ = QFileDialog.getOpenFileName(self, "Seleccionar archivo de logs", "", "Logs (*.jsonl *.log *.txt)")
         if file_path:
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                self.messages[self.current_port] = [line.strip() for line in lines if line.strip()]
-                self.filter_messages()
-                QMessageBox.information(self, "Éxito", "Logs cargados correctamente.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudieron cargar los logs:\n{e}")
+            port = self.current_port
+            capacity = self.message_capacity
+            self._start_transfer(
+                "Cargando logs...",
+                lambda progress, cancelled: self._import_logs(file_path, capacity, progress, cancelled),
+                lambda result, error: self.on_import_done(port, file_path, result, error),
+            )
+
+    @staticmethod
+    def _import_logs(file_path, capacity, progress, cancelled):
+        # Hilo de transferencias: solo se leen e indexan las últimas líneas; el
+        # resto del fichero se pagina desde disco al desplazarse hacia arriba
+        events = import_tail(file_path, capacity, progress, cancelled)
+        index = SearchIndex(capacity)
+        index.add_many(events)
+        return events, index
+
+    def on_import_done(self, port, file_path, result, error):
+        if isinstance(error, TransferCancelled) or port not in self.messages:
+            return
+        if error is not None:
+            QMessageBox.critical(self, "Error", f"No se pudieron cargar los logs:\n{error}")
+            return
+        events, index = result
+        self.messages[port] = RingBuffer(self.message_capacity, events)
+        self.search_indexes[port] = index
+        self.indexed_upto[port] = index.next_seq
+        self.imported_logs[port] = (file_path, self.delivered[port])
+        if port == self.current_port:
+            self.show_port_messages(port)
+        QMessageBox.information(self, "Éxito", "Logs cargados correctamente.")
+
+    def _start_transfer(self, label, job, done):
+        # Exportaciones e importaciones en un hilo aparte, con progreso y cancelación
+        cancelled = threading.Event()
+        self.transfer_cancel = cancelled
+        dialog = QProgressDialog(label, "Cancelar", 0, TRANSFER_PROGRESS_STEPS, self)
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(TRANSFER_DIALOG_DELAY_MS)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.canceled.connect(cancelled.set)
+        self.progress_dialog = dialog
+        self.transfer_executor.submit(self._run_transfer, job, cancelled, done)
+
+    def _run_transfer(self, job, cancelled, done):
+        def progress(current, total):
+            self.comm.transfer_progress.emit(int(current * TRANSFER_PROGRESS_STEPS / max(total, 1)))
+        try:
+            result, error = job(progress, cancelled), None
+        except Exception as e:
+            result, error = None, e
+        self.comm.transfer_done.emit(done, result, error)
+
+    def on_transfer_progress(self, value):
+        if self.progress_dialog is not None:
+            self.progress_dialog.setValue(value)
+
+    def on_transfer_done(self, done, result, error):
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect()
+            self.progress_dialog.close()
+            self.progress_dialog.deleteLater()
+            self.progress_dialog = None
+        self.transfer_cancel = None
+        if not self.closing:
+            done(result, error)
 
     def save_config(self):
         data = {
+            "engine": self.engine,
+            "drain_timeout": self.drain_timeout,
+            "ui_refresh_hz": self.refresh_hz,
+            "message_capacity": self.message_capacity,
+            "logging": self.log_writer.settings(),
             "servers": []
         }
-        for port, thread in self.servers.items():
-            data["servers"].append({
-                "name": self.port_to_name.get(port, ""),
-                "port": port,
-                "mode": thread.mode,
-                "static_dir": thread.static_dir
-            })
+        for thread in self.servers.values():
+            data["servers"].append(server_config(thread))
+        # Los que no arrancaron (p. ej. puerto ocupado) se conservan para la próxima vez
+        data["servers"].extend(self.unstarted.values())
         try:
             with open(CONFIG_FILE, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=4)
@@ -358,41 +927,115 @@ class ServerManagerApp(QMainWindow):
             QMessageBox.warning(self, "Error", f"No se pudo guardar la configuración:\n{e}")
 
     def load_config(self):
-        self.servers_list.clear()
+        # La configuración se lee aquí; los servidores se crean y enlazan en
+        # paralelo en segundo plano y cada fila muestra su estado al arrancar
+        if not os.path.exists(CONFIG_FILE):
+            return
         try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                for srv in data.get("servers", []):
-                    name = srv.get("name", "Servidor")
-                    port = srv.get("port", 0)
-                    mode = srv.get("mode", "simple")
-                    static_dir = srv.get("static_dir", None)
-                    if port in self.servers:
-                        continue
-                    try:
-                        server_thread = HttpServerThread(
-                            port,
-                            lambda msg, p=port, n=name: self.comm.new_message.emit(msg, p, n),
-                            name,
-                            mode,
-                            static_dir
-                        )
-                        server_thread.start()
-                        self.servers[port] = server_thread
-                        self.messages[port] = []
-                        self.port_to_name[port] = name
-                        self.servers_list.addItem(f"{name} (Puerto: {port})")
-                    except Exception:
-                        pass
-        except Exception as e:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
             QMessageBox.warning(self, "Error", f"No se pudo cargar la configuración:\n{e}")
+            return
+        engine = data.get("engine", DEFAULT_ENGINE)
+        if engine in ENGINES:
+            self.engine = engine
+        else:
+            QMessageBox.warning(self, "Error", f"Motor desconocido en la configuración: {engine}")
+        drain_timeout = data.get("drain_timeout", DEFAULT_DRAIN_TIMEOUT)
+        if isinstance(drain_timeout, (int, float)) and drain_timeout >= 0:
+            self.drain_timeout = drain_timeout
+        capacity = data.get("message_capacity", DEFAULT_MESSAGE_CAPACITY)
+        if isinstance(capacity, int) and capacity > 0:
+            self.message_capacity = capacity
+        refresh_hz = data.get("ui_refresh_hz", DEFAULT_REFRESH_HZ)
+        if isinstance(refresh_hz, (int, float)) and refresh_hz > 0:
+            self.refresh_hz = refresh_hz
+            self.batcher.interval = 1.0 / refresh_hz
+        try:
+            self.log_writer.configure(**data.get("logging", {}))
+        except (TypeError, ValueError) as e:
+            QMessageBox.warning(self, "Error", f"Configuración de logs inválida:\n{e}")
+        for srv in data.get("servers", []):
+            name = srv.get("name", "Servidor")
+            port = srv.get("port", 0)
+            if port in self.servers or port in self.starting or port in self.stopping:
+                continue
+            self._submit_start(srv, keep=True)
+
+    def _submit_start(self, srv, keep=False):
+        # Con keep, la entrada se conserva en config.json aunque no arranque
+        port = srv.get("port", 0)
+        name = srv.get("name", "Servidor")
+        self.starting[port] = name
+        if keep:
+            self.unstarted[port] = srv
+        self._set_server_item(port, name, "arrancando...")
+        self.lifecycle_executor.submit(self._start_server, self.engine, srv)
+
+    def _start_server(self, engine, srv):
+        # Hilo de arranque: crea, enlaza y arranca; el registro se hace en la interfaz
+        port = srv.get("port", 0)
+        try:
+            server = create_server(
+                engine,
+                port,
+                lambda msg, p=port: self.on_request(p, msg),
+                srv.get("name", "Servidor"),
+                srv.get("mode", "simple"),
+                srv.get("static_dir", None),
+                **server_options(srv)
+            )
+            server.start()
+        except Exception as e:
+            self.comm.server_started.emit(port, None, e)
+            return
+        if self.closing:
+            server.stop()
+            return
+        self.comm.server_started.emit(port, server, None)
+
+    def on_server_started(self, port, server, error):
+        self.restarting.pop(port, None)
+        name = self.starting.pop(port, None)
+        if name is None or self.closing:
+            if server is not None:
+                server.stop()
+            return
+        if error is None:
+            self.unstarted.pop(port, None)
+            self.register_server(port, name, server)
+        elif port in self.unstarted:
+            self._set_server_item(port, name, "error", str(error))
+            self.startup_errors.append(f"{name} (puerto {port}): {error}")
+        else:
+            # Abierto desde el diálogo: sin fila ni entrada en la configuración
+            self._remove_server_item(port)
+            self._forget_server(port)
+            QMessageBox.critical(self, "Error", f"No se pudo abrir el servidor:\n{error}")
+        if not self.starting and self.startup_errors:
+            errors, self.startup_errors = self.startup_errors, []
+            QMessageBox.warning(self, "Error", "No se pudieron abrir algunos servidores:\n" + "\n".join(errors))
 
     def closeEvent(self, event):
+        self.closing = True
+        self.lifecycle_executor.shutdown(wait=True, cancel_futures=True)
         self.save_config()
-        for thread in self.servers.values():
-            thread.stop()
-            thread.join()
+        # Todos a la vez, cada uno con su plazo; se incluyen los que se estaban
+        # cerrando o reiniciando por si su parada quedó cancelada en la cola
+        servers = (list(self.servers.values()) + [server for _, server in self.stopping.values()]
+                   + list(self.restarting.values()))
+        if servers:
+            with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="lifecycle") as pool:
+                for server in servers:
+                    pool.submit(server.stop, self.drain_timeout)
+        self.batcher.close()
+        self.search_executor.shutdown(wait=False, cancel_futures=True)
+        if self.transfer_cancel is not None:
+            self.transfer_cancel.set()
+        # Se espera a la transferencia en curso para que borre su fichero a medias
+        self.transfer_executor.shutdown(wait=True)
+        self.log_writer.close()
         event.accept()
 
 def main():
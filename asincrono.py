@@ -0,0 +1,440 @@
+import asyncio
+import html
+import mimetypes
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import (
+    DEFAULT_ERROR_CONTENT_TYPE, DEFAULT_ERROR_MESSAGE, BaseHTTPRequestHandler, SimpleHTTPRequestHandler
+)
+from estaticos import body_length, close_body, not_modified, validator_headers
+from eventos import request_event
+from ingesta import INGEST_METHODS, BodyTooLarge, read_body_async
+from limites import REJECT_TIMEOUT
+from metricas import METRICS_PATH, PROMETHEUS_CONTENT_TYPE
+from rutas import encode_response
+from servidores import (
+    DEFAULT_BACKLOG, DEFAULT_DRAIN_TIMEOUT, DEFAULT_POOL_SIZE, INDEX_PAGES, MAX_HEADER_BYTES, ServerOptionsMixin,
+    connection_headers, has_request_body, metrics_body
+)
+
+DRAIN_POLL_INTERVAL = 0.05
+
+# MOTOR ASYNCIO
+def guess_content_type(path):
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+class AsyncEngine:
+    # Un único bucle asyncio en segundo plano que atiende todos los puertos
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="asyncio-engine", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def call(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+class AsyncRequest:
+    __slots__ = ("method", "path", "version", "headers", "keep_alive", "served", "body")
+
+    def __init__(self, method, path, version, headers, keep_alive, served):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.keep_alive = keep_alive
+        self.served = served
+        self.body = b""
+
+class AsyncResponse:
+    # Escritura de una respuesta: guarda el estado, cuenta los bytes enviados
+    # y, en `logged`, la petición que debe registrarse como evento
+    __slots__ = ("writer", "status", "sent", "logged")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.status = None
+        self.sent = 0
+        self.logged = None
+
+    def write(self, data):
+        self.sent += len(data)
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def sendfile(self, f):
+        self.sent += await asyncio.get_running_loop().sendfile(self.writer.transport, f)
+
+class AsyncHttpServer(ServerOptionsMixin):
+    server_version = BaseHTTPRequestHandler.server_version
+    sys_version = BaseHTTPRequestHandler.sys_version
+
+    def __init__(self, port, message_callback, server_name, mode, static_dir=None,
+                 concurrency="threads", pool_size=DEFAULT_POOL_SIZE, backlog=DEFAULT_BACKLOG, cache=None,
+                 compression=None, keepalive=None, routes=None, ingest=None, limits=None, reuse_port=False,
+                 engine=None):
+        self.setup_options(
+            port, message_callback, server_name, mode, static_dir, concurrency, pool_size, backlog,
+            cache, compression, keepalive, routes, ingest, limits
+        )
+        self.setup_components()
+        self.engine = engine or AsyncEngine.shared()
+
+        self._sock = socket.create_server(('0.0.0.0', port), backlog=backlog, reuse_port=reuse_port)
+        self._sock.setblocking(False)
+        self._server = None
+        # Conexión abierta -> inactiva (esperando la siguiente petición)
+        self._connections = {}
+        self._stopped = threading.Event()
+
+    def start(self):
+        self.start_components()
+        self._server = self.engine.call(asyncio.start_server(
+            self._handle_connection, sock=self._sock, backlog=self.backlog, limit=MAX_HEADER_BYTES
+        ))
+
+    def stop(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        if self._server is not None:
+            self.engine.call(self._close(timeout))
+        else:
+            self._sock.close()
+        self.close_components()
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        self._stopped.wait(timeout)
+
+    def is_alive(self):
+        return self._server is not None and not self._stopped.is_set()
+
+    async def _close(self, timeout):
+        # Deja de aceptar conexiones, cierra las inactivas y espera hasta
+        # `timeout` a las peticiones en curso; después cierra las que queden
+        self._server.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._connections and loop.time() < deadline:
+            for writer, idle in list(self._connections.items()):
+                if idle:
+                    writer.close()
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = True
+        # asyncio solo desactiva Nagle si proto == IPPROTO_TCP, y los sockets
+        # de socket.create_server tienen proto 0
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.metrics.connection_opened()
+        keepalive = self.keepalive_settings
+        timeout = keepalive["timeout"] if keepalive["enabled"] else None
+        served = 0
+        peer = writer.get_extra_info('peername')
+        connected = self.limits is None or self.limits.connect(peer[0])
+        if not connected:
+            # Solo se espera a la petición lo justo para poder responder
+            timeout = REJECT_TIMEOUT
+        try:
+            while True:
+                self._connections[writer] = True
+                try:
+                    head = await asyncio.wait_for(self._read_head(reader, writer), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not head:
+                    break
+                started = time.perf_counter()
+                served += 1
+                response = AsyncResponse(writer)
+                keep_alive = await self._handle_request(head, reader, response, served, connected)
+                if response.status is not None:
+                    elapsed = time.perf_counter() - started
+                    self.metrics.record(response.status, elapsed, response.sent)
+                    request = response.logged
+                    if request is not None and self.message_callback is not None:
+                        self.message_callback(request_event(
+                            self.port, request.method, request.path, peer, response.status, elapsed
+                        ))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            if self.limits is not None and connected:
+                self.limits.disconnect(peer[0])
+            self.metrics.connection_closed()
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_head(self, reader, writer):
+        # Inactiva solo hasta el primer byte: con la cabecera a medio llegar
+        # la petición ya está en curso para _close. b"" si el cliente cierra
+        head = await reader.read(1)
+        if head:
+            self._connections[writer] = False
+            head += await reader.readuntil(b"\r\n\r\n")
+        return head
+
+    async def _handle_request(self, head, reader, response, served, connected=True):
+        # Atiende una petición; devuelve True si la conexión sigue abierta
+        lines = head.decode('iso-8859-1').split('\r\n')
+        words = lines[0].split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            await self._send_error(response, HTTPStatus.BAD_REQUEST, f"Bad request syntax ({lines[0]!r})")
+            return False
+        method, path, version = words
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        request = AsyncRequest(method, path, version, headers, self._keep_alive(version, headers, served), served)
+
+        if self.limits is not None:
+            # Antes de leer el cuerpo: un cliente rechazado no cuesta más lectura
+            if not connected:
+                return await self._reject(response, request, self.too_many_connections)
+            if not self.limits.allow(response.writer.get_extra_info('peername')[0]):
+                return await self._reject(response, request, self.too_many_requests)
+
+        if self.mode != "static":
+            if headers.get('expect', '').lower() == '100-continue' and version >= 'HTTP/1.1':
+                response.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            try:
+                # Se lee siempre: la conexión puede seguir abierta aunque la respuesta no use el cuerpo
+                request.body = await read_body_async(reader, headers, self.ingest_settings["max_body"])
+            except BodyTooLarge as e:
+                await self._send_error(response, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+                return False
+            except ValueError as e:
+                await self._send_error(response, HTTPStatus.BAD_REQUEST, str(e))
+                return False
+
+        if method in ("GET", "HEAD") and path.split('?', 1)[0] == METRICS_PATH:
+            body = metrics_body(self.port, self.metrics, self.static_files)
+            self._write_head(response, HTTPStatus.OK, [
+                ('Content-type', PROMETHEUS_CONTENT_TYPE), ('Content-Length', str(len(body)))
+            ], request=request, body=body if method == "GET" else b"")
+            await response.drain()
+            return request.keep_alive
+        if self.mode == "static":
+            if method not in ("GET", "HEAD"):
+                await self._send_error(response, HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method!r})")
+                return False
+            return await self._serve_static(response, request)
+        return await self._serve_route(response, request)
+
+    async def _serve_route(self, response, request):
+        found = self.route_table.match(request.method, request.path)
+        if found is None:
+            if self.ingestor is not None and request.method in INGEST_METHODS:
+                return await self._ingest(response, request)
+            await self._send_error(response, HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({request.method!r})")
+            return False
+        route, params = found
+        try:
+            # Las rutas de tipo fichero hacen stat (y releen el fichero si cambia)
+            data = await self._offload(
+                route.kind != "file", encode_response,
+                route, params, self._connection_headers(request), request.method == "HEAD"
+            )
+        except OSError:
+            await self._send_error(response, HTTPStatus.NOT_FOUND, "File not found")
+            return False
+        response.status = route.status.value
+        response.logged = request
+        response.write(data)
+        await response.drain()
+        return request.keep_alive
+
+    async def _ingest(self, response, request):
+        peer = response.writer.get_extra_info('peername')
+        accepted = self.ingestor.offer(
+            request.method, request.path, peer[0], request.headers.get('content-type'), request.body
+        )
+        route = self.ingest_accepted if accepted else self.ingest_busy
+        response.status = route.status.value
+        if accepted:
+            response.logged = request
+        response.write(encode_response(route, {}, self._connection_headers(request)))
+        await response.drain()
+        return request.keep_alive
+
+    async def _reject(self, response, request, route):
+        # Rechazo por límites: se registra como evento y se cierra la conexión
+        response.status = route.status.value
+        response.logged = request
+        response.write(encode_response(route, {}, (("Connection", "close"),), request.method == "HEAD"))
+        await response.drain()
+        return False
+
+    def _connection_headers(self, request):
+        keepalive = self.keepalive_settings
+        if not keepalive["enabled"]:
+            return ()
+        return connection_headers(keepalive, request.keep_alive, request.version, request.served)
+
+    def _keep_alive(self, version, headers, served):
+        # Mismas reglas que BaseHTTPRequestHandler.parse_request con protocol_version HTTP/1.1;
+        # solo el modo estático deja sin leer el cuerpo de la petición
+        keepalive = self.keepalive_settings
+        if not keepalive["enabled"] or served >= keepalive["max_requests"]:
+            return False
+        if self.mode == "static" and has_request_body(headers):
+            return False
+        connection = headers.get('connection', '').lower()
+        if connection == 'close':
+            return False
+        return version >= 'HTTP/1.1' or connection == 'keep-alive'
+
+    @staticmethod
+    async def _offload(inline, func, *args):
+        # Un solo bucle atiende todos los puertos: lo que tenga que leer,
+        # recorrer o comprimir ficheros va al executor; lo que ya está en
+        # memoria se resuelve aquí mismo
+        if inline:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _load_static(self, fs_path, headers):
+        # Todo lo que toca el disco para servir un fichero, en una sola llamada
+        # al executor: stat, hermanos precomprimidos y lectura o compresión.
+        # Devuelve (estado, cabeceras, cuerpo); cuerpo None en un 304
+        static_files = self.static_files
+        st = os.stat(fs_path)
+        content_type = guess_content_type(fs_path)
+        serve_path, serve_st, encoding, etag, vary = static_files.select(
+            fs_path, st, content_type, headers.get('accept-encoding')
+        )
+        extra = validator_headers(st, etag)
+        if vary:
+            extra.append(('Vary', 'Accept-Encoding'))
+        if not_modified(headers, st, etag):
+            return HTTPStatus.NOT_MODIFIED, extra, None
+        if encoding is not None and serve_path == fs_path:
+            body = static_files.compressed(fs_path, st, encoding, etag)
+        else:
+            # loop.sendfile ya evita copias; mmap no aporta nada aquí
+            body, _ = static_files.open(serve_path, serve_st, False)
+        if encoding is not None:
+            extra.insert(0, ('Content-Encoding', encoding))
+        return HTTPStatus.OK, [
+            ('Content-type', content_type),
+            ('Content-Length', str(body_length(body))),
+        ] + extra, body
+
+    async def _serve_static(self, response, request):
+        method, path, headers = request.method, request.path, request.headers
+        static_files = self.static_files
+        fs_path = static_files.translate(self.static_dir, path)
+        if await self._offload(static_files.in_memory(fs_path), static_files.isdir, fs_path):
+            parts = urllib.parse.urlsplit(path)
+            if not parts.path.endswith('/'):
+                new_url = urllib.parse.urlunsplit((parts[0], parts[1], parts[2] + '/', parts[3], parts[4]))
+                self._write_head(
+                    response, HTTPStatus.MOVED_PERMANENTLY, [('Location', new_url), ('Content-Length', '0')],
+                    request=request
+                )
+                await response.drain()
+                return request.keep_alive
+            for index in INDEX_PAGES:
+                index_path = os.path.join(fs_path, index)
+                if await self._offload(static_files.in_memory(index_path), static_files.isfile, index_path):
+                    fs_path = index_path
+                    break
+            else:
+                listing = await self._offload(
+                    static_files.in_memory(fs_path, listing=True), static_files.listing, fs_path, path
+                )
+                if listing is None:
+                    await self._send_error(response, HTTPStatus.NOT_FOUND, "No permission to list directory")
+                    return False
+                body, enc = listing
+                self._write_head(response, HTTPStatus.OK, [
+                    ('Content-type', f'text/html; charset={enc}'), ('Content-Length', str(len(body)))
+                ], request=request, body=body if method != "HEAD" else b"")
+                await response.drain()
+                return request.keep_alive
+
+        if fs_path.endswith('/'):
+            await self._send_error(response, HTTPStatus.NOT_FOUND, "File not found")
+            return False
+        try:
+            status, head, body = await asyncio.get_running_loop().run_in_executor(
+                None, self._load_static, fs_path, headers
+            )
+        except OSError:
+            await self._send_error(response, HTTPStatus.NOT_FOUND, "File not found")
+            return False
+        if body is None:
+            self._write_head(response, status, head, request=request)
+            await response.drain()
+            return request.keep_alive
+        try:
+            # Los cuerpos en memoria salen en la misma escritura que la cabecera
+            inline = isinstance(body, bytes) and method != "HEAD"
+            self._write_head(response, status, head, request=request, body=body if inline else b"")
+            if method != "HEAD" and not inline:
+                await response.sendfile(body)
+            await response.drain()
+        finally:
+            close_body(body)
+        return request.keep_alive
+
+    async def _send_error(self, response, status, message=None):
+        status = HTTPStatus(status)
+        message = message or status.phrase
+        body = (DEFAULT_ERROR_MESSAGE % {
+            'code': status.value,
+            'message': html.escape(message, quote=False),
+            'explain': html.escape(status.description, quote=False),
+        }).encode('UTF-8', 'replace')
+        self._write_head(response, status, [
+            ('Content-Type', DEFAULT_ERROR_CONTENT_TYPE),
+            ('Connection', 'close'),
+            ('Content-Length', str(len(body))),
+        ], message, body=body)
+        await response.drain()
+
+    def _write_head(self, response, status, headers, message=None, request=None, body=b""):
+        response.status = int(status)
+        response.write(self._response_head(status, headers, message, request) + body)
+
+    def _response_head(self, status, headers, message=None, request=None):
+        status = HTTPStatus(status)
+        server_version = SimpleHTTPRequestHandler.server_version if self.mode == "static" else self.server_version
+        keepalive = self.keepalive_settings
+        lines = [
+            f"{'HTTP/1.1' if keepalive['enabled'] else 'HTTP/1.0'} {status.value} {message or status.phrase}",
+            f"Server: {server_version} {self.sys_version}",
+            f"Date: {formatdate(usegmt=True)}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if request is not None and keepalive["enabled"]:
+            lines.extend(f"{name}: {value}" for name, value in connection_headers(
+                keepalive, request.keep_alive, request.version, request.served
+            ))
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1', 'strict')
@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from registro import LogWriter
+from servidores import DEFAULT_BACKLOG, DEFAULT_POOL_SIZE, ENGINES, create_server
+
+# Banco de pruebas sin interfaz: arranca servidores en cada motor y modo de
+# concurrencia, los carga desde procesos aparte y escribe los resultados en JSON.
+#
+#   python benchmark.py --duration 5 --concurrency 64 --output resultados.json
+#   python benchmark.py --baseline resultados.json
+
+DEFAULT_DURATION = 5.0
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TOLERANCE = 0.10
+BASE_PORT = 18700
+STATIC_FILES = (
+    ("small.bin", 1024),
+    ("medium.bin", 64 * 1024),
+    ("large.bin", 1024 * 1024),
+)
+# (motor, concurrencia, prefork): las variantes prefork usan --processes procesos
+SERVER_VARIANTS = (
+    ("threaded", "threads", False),
+    ("threaded", "pool", False),
+    ("asyncio", "threads", False),
+    ("threaded", "threads", True),
+    ("asyncio", "threads", True),
+)
+DEFAULT_PROCESSES = 2
+PERCENTILES = (0.5, 0.9, 0.99)
+RESPONSE_TIMEOUT = 10.0
+
+# GENERADOR DE CARGA
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("iso-8859-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    length = None
+    close = not lines[0].startswith("HTTP/1.1")
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            close = value.strip().lower() == "close"
+    if length is None:
+        body = await reader.read()
+        close = True
+    else:
+        body = await reader.readexactly(length)
+    return status, len(head) + len(body), close
+
+async def _client(host, port, request, deadline, keepalive, stats):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        # Sin keep-alive la latencia incluye el establecimiento de la conexión
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, received, close = await asyncio.wait_for(_read_response(reader), RESPONSE_TIMEOUT)
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["bytes"] += received
+            if status >= 400:
+                stats["errors"] += 1
+            if close or not keepalive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError):
+            stats["errors"] += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+    if writer is not None:
+        writer.close()
+
+async def _run_load(host, port, path, concurrency, duration, keepalive):
+    version = "HTTP/1.1" if keepalive else "HTTP/1.0"
+    request = f"GET {path} {version}\r\nHost: {host}:{port}\r\nUser-Agent: nodofiel-benchmark\r\n\r\n".encode()
+    stats = {"latencies": [], "bytes": 0, "errors": 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _client(host, port, request, deadline, keepalive, stats) for _ in range(concurrency)
+    ))
+    return stats
+
+def load_worker(host, port, path, concurrency, duration, keepalive):
+    # Se ejecuta en un proceso aparte para no competir por el GIL con el servidor
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+    stats = asyncio.run(_run_load(host, port, path, concurrency, duration, keepalive))
+    stats["elapsed"] = time.perf_counter() - started
+    stats["cpu"] = time.process_time() - cpu_before
+    return stats
+
+# MEDICIONES
+def current_rss():
+    # RSS actual en bytes; sin /proc se usa el máximo que da getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(results, elapsed, cpu, rss):
+    latencies = sorted(latency for stats in results for latency in stats["latencies"])
+    requests = len(latencies)
+    received = sum(stats["bytes"] for stats in results)
+    summary = {
+        "requests": requests,
+        "errors": sum(stats["errors"] for stats in results),
+        "rps": requests / elapsed if elapsed else 0.0,
+        "mb_per_s": received / elapsed / (1024 * 1024) if elapsed else 0.0,
+        "latency_ms": {
+            f"p{int(q * 100)}": (percentile(latencies, q) or 0.0) * 1000 for q in PERCENTILES
+        },
+        "server_cpu_s": cpu,
+        "server_cpu_pct": 100.0 * cpu / elapsed if elapsed else 0.0,
+        "client_cpu_s": sum(stats["cpu"] for stats in results),
+        "server_rss_mb": rss / (1024 * 1024),
+    }
+    summary["latency_ms"]["max"] = latencies[-1] * 1000 if latencies else 0.0
+    return summary
+
+# ESCENARIOS
+def make_static_root(root):
+    for name, size in STATIC_FILES:
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(os.urandom(size))
+
+def scenarios(args):
+    for engine, concurrency, prefork in SERVER_VARIANTS:
+        if engine not in args.engines:
+            continue
+        if prefork and (args.processes < 2 or not hasattr(socket, "SO_REUSEPORT")):
+            continue
+        processes = args.processes if prefork else 1
+        yield engine, concurrency, processes, "simple", "/"
+        for name, _ in STATIC_FILES:
+            yield engine, concurrency, processes, "static", f"/{name}"
+
+def scenario_key(scenario):
+    variant = "{engine}/{concurrency}".format(**scenario)
+    # Los resultados anteriores a prefork no tienen "processes"
+    if scenario.get("processes", 1) > 1:
+        variant += f"x{scenario['processes']}"
+    return "{}/{mode}{path}".format(variant, **scenario)
+
+def run_scenario(executor, args, port, engine, concurrency, processes, mode, path, static_root, log_writer):
+    server = create_server(
+        engine, port, lambda msg: log_writer.write(port, msg), f"bench-{port}", mode,
+        static_root if mode == "static" else None, processes,
+        concurrency=concurrency, pool_size=args.pool_size, backlog=args.backlog,
+        keepalive={"enabled": args.keepalive},
+    )
+    server.start()
+    try:
+        per_client = max(1, args.concurrency // args.clients)
+        cpu_before = time.process_time()
+        started = time.perf_counter()
+        futures = [
+            executor.submit(load_worker, "127.0.0.1", port, path, per_client, args.duration, args.keepalive)
+            for _ in range(args.clients)
+        ]
+        results = [future.result() for future in futures]
+        elapsed = max(stats["elapsed"] for stats in results)
+        cpu = time.process_time() - cpu_before
+        rss = current_rss()
+    finally:
+        server.stop()
+        server.join(5)
+    result = {
+        "engine": engine,
+        "concurrency": concurrency,
+        "processes": processes,
+        "mode": mode,
+        "path": path,
+    }
+    result.update(summarize(results, elapsed, cpu, rss))
+    return result
+
+def compare(results, baseline, tolerance):
+    # Regresiones frente a un JSON anterior: menos rps o p99 más alto que la tolerancia
+    previous = {scenario_key(entry): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get(scenario_key(entry))
+        if old is None:
+            continue
+        if old["rps"] and entry["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario_key(entry)}: rps {old['rps']:.0f} -> {entry['rps']:.0f}")
+        old_p99 = old["latency_ms"]["p99"]
+        if old_p99 and entry["latency_ms"]["p99"] > old_p99 * (1 + tolerance):
+            regressions.append(
+                f"{scenario_key(entry)}: p99 {old_p99:.2f} ms -> {entry['latency_ms']['p99']:.2f} ms"
+            )
+    return regressions
+
+def print_result(entry):
+    latency = entry["latency_ms"]
+    print(
+        f"{scenario_key(entry):<36} {entry['rps']:>9.0f} req/s {entry['mb_per_s']:>8.1f} MB/s "
+        f"p50 {latency['p50']:>7.2f} p99 {latency['p99']:>7.2f} ms "
+        f"cpu {entry['server_cpu_pct']:>5.0f}% rss {entry['server_rss_mb']:>6.1f} MB "
+        f"err {entry['errors']}"
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de los servidores HTTP")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="segundos por escenario")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="conexiones simultáneas")
+    parser.add_argument("--clients", type=int, default=1, help="procesos generadores de carga")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES,
+                        help="procesos de las variantes prefork (menos de 2 las omite)")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG)
+    parser.add_argument("--keepalive", action="store_true", help="HTTP/1.1 con conexiones persistentes")
+    parser.add_argument("--port", type=int, default=BASE_PORT, help="primer puerto a usar")
+    parser.add_argument("--output", help="fichero JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="empeoramiento relativo admitido antes de marcar una regresión")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="nodofiel-bench-") as workdir:
+        static_root = os.path.join(workdir, "www")
+        os.makedirs(static_root)
+        make_static_root(static_root)
+        log_writer = LogWriter(os.path.join(workdir, "logs"))
+        os.makedirs(log_writer.logs_dir)
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=args.clients, mp_context=context) as executor:
+                for i, (engine, concurrency, processes, mode, path) in enumerate(scenarios(args)):
+                    entry = run_scenario(
+                        executor, args, args.port + i, engine, concurrency, processes, mode, path,
+                        static_root, log_writer
+                    )
+                    print_result(entry)
+                    results.append(entry)
+        finally:
+            log_writer.close()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "clients": args.clients,
+            "keepalive": args.keepalive,
+            "pool_size": args.pool_size,
+            "processes": args.processes,
+            "backlog": args.backlog,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regresiones respecto a", args.baseline)
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("Sin regresiones respecto a", args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
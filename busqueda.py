@@ -0,0 +1,320 @@
+import ipaddress
+import re
+import shlex
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from eventos import RequestEvent, search_text
+
+TOKEN_RE = re.compile(r"\w+")
+RELATIVE_TIME_RE = re.compile(r"^-?(\d+)([smhd])$")
+TIME_FORMATS = (
+    ("%Y-%m-%d %H:%M:%S", None),
+    ("%Y-%m-%dT%H:%M:%S", None),
+    ("%Y-%m-%dT%H:%M", timedelta(minutes=1)),
+    ("%Y-%m-%d", timedelta(days=1)),
+)
+CLOCK_FORMATS = (
+    ("%H:%M:%S", None),
+    ("%H:%M", timedelta(minutes=1)),
+)
+RELATIVE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+QUERY_FIELDS = ("ip", "method", "path", "since", "until")
+
+def parse_time(value, upper=False, now=None):
+    # Devuelve un timestamp. Con upper=True, una fecha sin hora se toma hasta el final de su unidad
+    now = now or datetime.now()
+    match = RELATIVE_TIME_RE.match(value)
+    if match:
+        return (now - timedelta(**{RELATIVE_UNITS[match.group(2)]: int(match.group(1))})).timestamp()
+    for fmt, unit in TIME_FORMATS:
+        try:
+            moment = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if upper and unit is not None:
+            moment += unit - timedelta(microseconds=1)
+        return moment.timestamp()
+    for fmt, unit in CLOCK_FORMATS:
+        try:
+            clock = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        moment = now.replace(hour=clock.hour, minute=clock.minute, second=clock.second, microsecond=0)
+        if upper and unit is not None:
+            moment += unit - timedelta(microseconds=1)
+        return moment.timestamp()
+    raise ValueError(f"Fecha u hora no válida: {value}")
+
+def ip_pattern(value):
+    # ip:10.0.0.* por prefijo o ip:10.0.0.0/24 por red; None si es una IP exacta
+    if value.endswith("*"):
+        prefix = value[:-1]
+        return lambda ip: ip.startswith(prefix)
+    if "/" not in value:
+        return None
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise ValueError(f"Red no válida: {value}") from None
+
+    def in_network(ip):
+        try:
+            return ipaddress.ip_address(ip) in network
+        except ValueError:
+            return False
+    return in_network
+
+class Query:
+    # Texto libre y filtros por campo: ip:10.0.0.5 method:GET path:/api since:-1h until:2024-05-01
+    # ip: es exacta salvo con comodín final (ip:10.0.0.*) o en notación CIDR (ip:10.0.0.0/24)
+    def __init__(self, terms=(), ips=(), methods=(), paths=(), since=None, until=None):
+        self.terms = [term.lower() for term in terms]
+        self.ips = list(ips)
+        self.ip_exact = set()
+        self.ip_patterns = []
+        for value in self.ips:
+            pattern = ip_pattern(value)
+            if pattern is None:
+                self.ip_exact.add(value)
+            else:
+                self.ip_patterns.append(pattern)
+        self.methods = [method.upper() for method in methods]
+        self.paths = list(paths)
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        try:
+            words = shlex.split(text)
+        except ValueError:
+            words = text.split()
+        fields = {field: [] for field in QUERY_FIELDS}
+        terms = []
+        for word in words:
+            name, sep, value = word.partition(":")
+            if sep and name.lower() in fields and value:
+                fields[name.lower()].append(value)
+            else:
+                terms.append(word)
+        since = max(parse_time(value) for value in fields["since"]) if fields["since"] else None
+        until = min(parse_time(value, upper=True) for value in fields["until"]) if fields["until"] else None
+        return cls(terms, fields["ip"], fields["method"], fields["path"], since, until)
+
+    def is_empty(self):
+        return not (self.terms or self.ips or self.methods or self.paths
+                    or self.since is not None or self.until is not None)
+
+    def matches(self, event):
+        # Los términos libres buscan en método, ruta, IP y estado (o en el texto de un aviso)
+        if self.terms:
+            lowered = search_text(event)
+            if any(term not in lowered for term in self.terms):
+                return False
+        if not self.matches_time(event):
+            return False
+        if not (self.ips or self.methods or self.paths):
+            return True
+        if type(event) is not RequestEvent:
+            return False
+        if self.ips and not self.matches_ip(event.ip):
+            return False
+        if self.methods and event.method not in self.methods:
+            return False
+        if self.paths and not any(event.path.startswith(value) for value in self.paths):
+            return False
+        return True
+
+    def matches_ip(self, ip):
+        return ip in self.ip_exact or any(pattern(ip) for pattern in self.ip_patterns)
+
+    def matches_time(self, event):
+        if self.since is not None and (event.ts is None or event.ts < self.since):
+            return False
+        return self.until is None or (event.ts is not None and event.ts <= self.until)
+
+def _event_tokens(event):
+    if type(event) is RequestEvent:
+        return set(TOKEN_RE.findall(event.path.lower()))
+    return set(TOKEN_RE.findall(event.text.lower()))
+
+class SearchIndex:
+    # Índice incremental de los últimos `capacity` eventos de un puerto:
+    # tokens, campos de las peticiones y timestamps ordenados. Los eventos
+    # pueden llegar algo desordenados: _times guarda el máximo acumulado y
+    # _lag el mayor retraso visto, así que since/until se buscan por bisección
+    # en un rango ampliado y solo los bordes se comprueban con su ts real.
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._reset()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._first = 0
+        self._next = 0
+        self._base = 0
+        self._messages = []
+        self._times = []
+        self._lag = 0.0
+        self._untimed = set()
+        self._tokens = {}
+        self._ips = {}
+        self._methods = {}
+        self._paths = {}
+        self._statuses = {}
+
+    def __len__(self):
+        return self._next - self._first
+
+    @property
+    def next_seq(self):
+        return self._next
+
+    def add_many(self, events):
+        with self._lock:
+            for event in events:
+                self._add(event)
+            return self._next
+
+    def between(self, start, stop):
+        with self._lock:
+            start = max(start, self._first)
+            stop = min(stop, self._next)
+            return [self._messages[s - self._base] for s in range(start, stop)]
+
+    def query(self, query):
+        # Devuelve (mensajes coincidentes, siguiente secuencia sin indexar)
+        with self._lock:
+            seqs = self._candidates(query)
+            base = self._base
+            messages = self._messages
+            # Los términos de un solo token quedan resueltos por el índice; el
+            # resto (varias palabras, símbolos) se comprueban como subcadena
+            pending = [term for term in query.terms if not TOKEN_RE.fullmatch(term)]
+            if pending:
+                result = []
+                for s in seqs:
+                    lowered = search_text(messages[s - base])
+                    if all(term in lowered for term in pending):
+                        result.append(messages[s - base])
+            else:
+                result = [messages[s - base] for s in seqs]
+            return result, self._next
+
+    def _add(self, event):
+        seq = self._next
+        previous = self._times[-1] if self._times else float("-inf")
+        if event.ts is not None:
+            ts = max(previous, event.ts)
+            self._lag = max(self._lag, ts - event.ts)
+        else:
+            ts = previous
+            self._untimed.add(seq)
+        self._messages.append(event)
+        self._times.append(ts)
+        for token in _event_tokens(event):
+            self._tokens.setdefault(token, set()).add(seq)
+        if type(event) is RequestEvent:
+            self._ips.setdefault(event.ip, set()).add(seq)
+            self._methods.setdefault(event.method, set()).add(seq)
+            self._paths.setdefault(event.path, set()).add(seq)
+            self._statuses.setdefault(event.status, set()).add(seq)
+        self._next += 1
+        if self._next - self._first > self.capacity:
+            self._evict()
+
+    def _evict(self):
+        seq = self._first
+        event = self._messages[seq - self._base]
+        for token in _event_tokens(event):
+            self._discard(self._tokens, token, seq)
+        if type(event) is RequestEvent:
+            self._discard(self._ips, event.ip, seq)
+            self._discard(self._methods, event.method, seq)
+            self._discard(self._paths, event.path, seq)
+            self._discard(self._statuses, event.status, seq)
+        self._untimed.discard(seq)
+        self._first += 1
+        if self._first - self._base >= self.capacity:
+            drop = self._first - self._base
+            del self._messages[:drop]
+            del self._times[:drop]
+            self._base = self._first
+
+    @staticmethod
+    def _discard(postings, key, seq):
+        entries = postings.get(key)
+        if entries is not None:
+            entries.discard(seq)
+            if not entries:
+                del postings[key]
+
+    def _candidates(self, query):
+        sets = []
+        for term in query.terms:
+            for token in TOKEN_RE.findall(term):
+                # Los tokens solo salen de rutas y avisos; IP, método y estado
+                # se buscan en sus propias listas
+                accept = lambda key, t=token: t in str(key).lower()
+                sets.append(
+                    self._union(self._tokens, accept) | self._union(self._ips, accept)
+                    | self._union(self._methods, accept) | self._union(self._statuses, accept)
+                )
+        if query.ips:
+            ips = set().union(*(self._ips.get(ip, ()) for ip in query.ip_exact))
+            if query.ip_patterns:
+                ips |= self._union(self._ips, lambda key: any(pattern(key) for pattern in query.ip_patterns))
+            sets.append(ips)
+        if query.methods:
+            sets.append(set().union(*(self._methods.get(method, ()) for method in query.methods)))
+        if query.paths:
+            sets.append(self._union(self._paths, lambda key: any(key.startswith(v) for v in query.paths)))
+
+        lo, hi, inner_lo, inner_hi = self._time_range(query)
+        if sets:
+            sets.sort(key=len)
+            candidates = sets[0].intersection(*sets[1:])
+            if lo > self._first or hi < self._next:
+                candidates = [seq for seq in candidates if lo <= seq < hi]
+            candidates = sorted(candidates)
+        else:
+            candidates = range(lo, hi)
+        if query.since is None and query.until is None:
+            return candidates
+        # Fuera de [inner_lo, inner_hi) el máximo acumulado no basta para
+        # decidir; dentro, solo sobran los eventos sin ts
+        base = self._base
+        messages = self._messages
+        untimed = self._untimed
+        return [
+            seq for seq in candidates
+            if (query.matches_time(messages[seq - base]) if not inner_lo <= seq < inner_hi else seq not in untimed)
+        ]
+
+    @staticmethod
+    def _union(postings, accept):
+        result = set()
+        for key, entries in postings.items():
+            if accept(key):
+                result |= entries
+        return result
+
+    def _time_range(self, query):
+        # (lo, hi) contiene todos los eventos que pueden caer en el rango;
+        # los de [inner_lo, inner_hi) caen seguro si tienen ts
+        lo, hi = self._first, self._next
+        inner_lo, inner_hi = lo, hi
+        offset = self._first - self._base
+        if query.since is not None:
+            lo = self._base + bisect_left(self._times, query.since, offset)
+            inner_lo = self._base + bisect_left(self._times, query.since + self._lag, offset)
+        if query.until is not None:
+            hi = self._base + bisect_right(self._times, query.until + self._lag, offset)
+            inner_hi = self._base + bisect_right(self._times, query.until, offset)
+        return lo, max(lo, hi), inner_lo, inner_hi
@@ -51,13 +51,10 @@ class SplashScreen(QWidget):
                                 self.height() - self.version_label.height() - 10)
 
         self.items_to_check = ["config.json", "logs"]
-        self.total_checks = len(self.items_to_check)
-        self.current_check = 0
-        self.progress_value = 0
-        self.steps_per_check = 100 // max(self.total_checks, 1)
-
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.handle_timer)
+        # Cada paso es trabajo real; la barra avanza al terminar cada uno
+        self.steps = [(f"Comprobando {item}", lambda item=item: self.check_item(item)) for item in self.items_to_check]
+        self.steps.append(("Leyendo configuración", self.check_config))
+        self.current_step = 0
 
     def set_rounded_corners(self, radius):
         path = QPainterPath()
@@ -68,36 +65,21 @@ class SplashScreen(QWidget):
 
     def start(self):
         self.show()
-        self.timer.start(20)
-
-    def handle_timer(self):
-        if self.progress_value < 100:
-            self.progress_value += 1
-
-            if (self.progress_value % self.steps_per_check == 0) and (self.current_check < self.total_checks):
-                item_name = self.items_to_check[self.current_check]
-                full_path = os.path.join(self.base_dir, item_name)
-
-                if os.path.isfile(full_path):
-                    print(f"✔ Archivo encontrado: {item_name}")
-                elif os.path.isdir(full_path):
-                    print(f"✔ Carpeta encontrada: {item_name}")
-                else:
-                    print(f"✘ No encontrado: {item_name} - Creando...")
-
-                    if item_name.endswith(".json"):
-                        with open(full_path, "w") as f:
-                            json.dump({}, f)
-                        print(f"Archivo {item_name} creado.")
-                    else:
-                        os.makedirs(full_path, exist_ok=True)
-                        print(f"Carpeta {item_name} creada.")
-
-                self.current_check += 1
+        QTimer.singleShot(0, self.run_next_step)
 
-            self.progress.setValue(self.progress_value)
+    def run_next_step(self):
+        if self.current_step < len(self.steps):
+            label, step = self.steps[self.current_step]
+            self.progress.setFormat(f"{label}... %p%")
+            try:
+                step()
+            except Exception as e:
+                print(f"✘ {label}: {e}")
+            self.current_step += 1
+            self.progress.setValue(100 * self.current_step // len(self.steps))
+            # Se vuelve al bucle de eventos para que la barra se repinte entre pasos
+            QTimer.singleShot(0, self.run_next_step)
         else:
-            self.timer.stop()
             self.close()
 
             # Ejecutar NodoFiel.exe al terminar el splash
@@ -108,6 +90,35 @@ class SplashScreen(QWidget):
             else:
                 print("NodoFiel.exe no encontrado.")
 
+    def check_item(self, item_name):
+        full_path = os.path.join(self.base_dir, item_name)
+
+        if os.path.isfile(full_path):
+            print(f"✔ Archivo encontrado: {item_name}")
+        elif os.path.isdir(full_path):
+            print(f"✔ Carpeta encontrada: {item_name}")
+        else:
+            print(f"✘ No encontrado: {item_name} - Creando...")
+
+            if item_name.endswith(".json"):
+                with open(full_path, "w") as f:
+                    json.dump({}, f)
+                print(f"Archivo {item_name} creado.")
+            else:
+                os.makedirs(full_path, exist_ok=True)
+                print(f"Carpeta {item_name} creada.")
+
+    def check_config(self):
+        # Detecta aquí una configuración ilegible o carpetas estáticas que ya no existen
+        with open(os.path.join(self.base_dir, "config.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        servers = data.get("servers", [])
+        for srv in servers:
+            static_dir = srv.get("static_dir")
+            if srv.get("mode") == "static" and static_dir and not os.path.isdir(static_dir):
+                print(f"✘ Carpeta raíz no encontrada para el puerto {srv.get('port')}: {static_dir}")
+        print(f"✔ Configuración leída: {len(servers)} servidores")
+
     def get_version_from_qp(self):
         qp_path = os.path.join(self.base_dir, "version.qp")
         today = datetime.now().date()
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from eventos import as_event
+from registro import LogWriter
+from servidores import DEFAULT_DRAIN_TIMEOUT, DEFAULT_ENGINE, ENGINES, create_server, server_options
+
+# Servidores sin interfaz gráfica: lee el mismo config.json que NodoFiel.py
+# y escribe los mismos logs. SIGTERM/SIGINT paran, SIGHUP recarga la configuración.
+#
+#   python demonio.py --config config.json --logs logs
+
+CONFIG_FILE = "config.json"
+LOGS_DIR = "logs"
+
+def report(message):
+    print(message, file=sys.stderr, flush=True)
+
+class Daemon:
+    def __init__(self, config_path=CONFIG_FILE, logs_dir=LOGS_DIR):
+        self.config_path = config_path
+        os.makedirs(logs_dir, exist_ok=True)
+        self.log_writer = LogWriter(logs_dir)
+        self.engine = DEFAULT_ENGINE
+        self.drain_timeout = DEFAULT_DRAIN_TIMEOUT
+        self.servers = {}
+        self.server_entries = {}
+        self._wake = threading.Event()
+        self._stop_requested = False
+        self._reload_requested = False
+
+    def on_request(self, port, message):
+        self.log_writer.write(port, as_event(port, message))
+
+    def read_config(self):
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def apply_config(self, data):
+        # Arranca, para o reinicia solo los servidores cuya entrada ha cambiado
+        engine = data.get("engine", DEFAULT_ENGINE)
+        if engine not in ENGINES:
+            report(f"Motor desconocido en la configuración: {engine}")
+            engine = self.engine
+        try:
+            self.log_writer.configure(**data.get("logging", {}))
+        except (TypeError, ValueError) as e:
+            report(f"Configuración de logs inválida: {e}")
+        drain_timeout = data.get("drain_timeout", DEFAULT_DRAIN_TIMEOUT)
+        if isinstance(drain_timeout, (int, float)) and drain_timeout >= 0:
+            self.drain_timeout = drain_timeout
+        else:
+            report(f"drain_timeout inválido en la configuración: {drain_timeout!r}")
+
+        wanted = {}
+        for srv in data.get("servers", []):
+            port = srv.get("port", 0)
+            if port in wanted:
+                report(f"Puerto {port} repetido en la configuración; se ignora")
+                continue
+            wanted[port] = srv
+
+        stopped = []
+        for port in list(self.servers):
+            old, new = self.server_entries[port], wanted.get(port)
+            if engine == self.engine and new is not None and old != new and self.routes_only_changed(old, new):
+                self.reload_routes(port, new)
+            elif engine != self.engine or old != new:
+                stopped.append(port)
+        self.stop_servers(stopped)
+        self.engine = engine
+        for port, srv in wanted.items():
+            if port not in self.servers:
+                self.start_server(srv)
+
+    @staticmethod
+    def routes_only_changed(old, new):
+        return {k: v for k, v in old.items() if k != "routes"} == {k: v for k, v in new.items() if k != "routes"}
+
+    def reload_routes(self, port, srv):
+        # Las rutas se cambian sin reiniciar el servidor
+        server = self.servers[port]
+        try:
+            server.set_routes(srv.get("routes") or [])
+        except (TypeError, ValueError) as e:
+            report(f"Rutas inválidas en el puerto {port}; se mantienen las anteriores: {e}")
+            return
+        self.server_entries[port] = srv
+        report(f"Rutas del servidor {server.server_name} (puerto {port}) recargadas")
+
+    def start_server(self, srv):
+        name = srv.get("name", "Servidor")
+        port = srv.get("port", 0)
+        try:
+            server = create_server(
+                self.engine,
+                port,
+                lambda msg, p=port: self.on_request(p, msg),
+                name,
+                srv.get("mode", "simple"),
+                srv.get("static_dir", None),
+                **server_options(srv)
+            )
+            server.start()
+        except Exception as e:
+            report(f"No se pudo abrir el servidor {name} (puerto {port}): {e}")
+            return
+        self.servers[port] = server
+        self.server_entries[port] = srv
+        report(f"Servidor {name} escuchando en el puerto {port} ({self.engine}, {server.mode})")
+
+    def stop_server(self, port):
+        server = self.servers.pop(port)
+        self.server_entries.pop(port, None)
+        server.stop(self.drain_timeout)
+        server.join(self.drain_timeout)
+        self.log_writer.flush(port)
+        report(f"Servidor {server.server_name} (puerto {port}) detenido")
+
+    def stop_servers(self, ports):
+        # Todos a la vez: cada uno espera su plazo de drenaje en paralelo
+        if not ports:
+            return
+        with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="stop") as pool:
+            for future in [pool.submit(self.stop_server, port) for port in ports]:
+                future.result()
+
+    def reload(self):
+        try:
+            data = self.read_config()
+        except (OSError, ValueError) as e:
+            report(f"No se pudo recargar la configuración; se mantiene la actual: {e}")
+            return
+        self.apply_config(data)
+
+    def request_stop(self, signum=None, frame=None):
+        self._stop_requested = True
+        self._wake.set()
+
+    def request_reload(self, signum=None, frame=None):
+        self._reload_requested = True
+        self._wake.set()
+
+    def run(self):
+        # Los manejadores de señales solo marcan la petición: el trabajo se
+        # hace en este bucle, fuera del contexto de la señal
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.request_reload)
+        self.apply_config(self.read_config())
+        if not self.servers:
+            report("No hay servidores en marcha")
+        try:
+            while not self._stop_requested:
+                self._wake.wait()
+                self._wake.clear()
+                if self._reload_requested and not self._stop_requested:
+                    self._reload_requested = False
+                    report("Recargando la configuración")
+                    self.reload()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stop_servers(list(self.servers))
+        self.log_writer.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidores HTTP de NodoFiel sin interfaz gráfica")
+    parser.add_argument("--config", default=CONFIG_FILE, help="fichero de configuración (config.json)")
+    parser.add_argument("--logs", default=LOGS_DIR, help="carpeta de logs")
+    args = parser.parse_args(argv)
+    daemon = Daemon(args.config, args.logs)
+    try:
+        daemon.run()
+    except (OSError, ValueError) as e:
+        report(f"No se pudo cargar la configuración: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
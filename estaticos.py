@@ -0,0 +1,673 @@
+import functools
+import gzip
+import html
+import mimetypes
+import mmap
+import os
+import posixpath
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "max_bytes": 64 * 1024 * 1024,
+    "max_entry_bytes": 1024 * 1024,
+    "use_mmap": True,
+    "mmap_max_bytes": 8 * 1024 * 1024,
+    "directory_index": True,
+    "index_watch": True,
+    "index_poll_interval": 2.0,
+    "index_max_directories": 4096,
+}
+
+DEFAULT_COMPRESSION_SETTINGS = {
+    "enabled": True,
+    "level": 6,
+    "min_bytes": 1024,
+    "max_bytes": 8 * 1024 * 1024,
+    "cache_bytes": 32 * 1024 * 1024,
+    "types": [
+        "text/", "application/javascript", "application/json", "application/xml",
+        "application/manifest+json", "application/wasm", "image/svg+xml",
+    ],
+    "precompress": False,
+}
+
+# Orden de preferencia al negociar Accept-Encoding
+ENCODINGS = ("br", "gzip")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Marcas de una entrada en el índice de directorios
+ENTRY_DIR = 1
+ENTRY_FILE = 2
+ENTRY_LINK = 4
+ENTRY_OTHER = 8
+# Eventos de watchdog que cambian las entradas de un directorio
+INDEX_EVENTS = ("created", "deleted", "moved")
+# Rutas de URL ya traducidas que se recuerdan por raíz
+TRANSLATE_CACHE_SIZE = 4096
+# Un directorio modificado hace menos de esto puede cambiar de nuevo sin que
+# cambie su fecha (sistemas de ficheros con resolución de un segundo)
+RACY_WINDOW = 1.0
+
+def merge_settings(defaults, settings, label):
+    merged = dict(defaults)
+    if settings:
+        unknown = set(settings) - set(defaults)
+        if unknown:
+            raise ValueError(f"Opciones de {label} desconocidas: {', '.join(sorted(unknown))}")
+        merged.update(settings)
+    return merged
+
+def cache_settings(settings=None):
+    return merge_settings(DEFAULT_CACHE_SETTINGS, settings, "caché")
+
+def compression_settings(settings=None):
+    return merge_settings(DEFAULT_COMPRESSION_SETTINGS, settings, "compresión")
+
+def parse_accept_encoding(header):
+    # {codificación: q}; "*" se aplica a las no mencionadas
+    accepted = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+def accepts(accepted, encoding):
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+def can_compress(encoding):
+    return encoding == "gzip" or (encoding == "br" and brotli is not None)
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(11, max(0, level)))
+    return gzip.compress(data, compresslevel=min(9, max(1, level)), mtime=0)
+
+def is_compressible(content_type, types):
+    return any(content_type.startswith(prefix) if prefix.endswith("/") else content_type == prefix
+               for prefix in types)
+
+def make_etag(st):
+    # ETag fuerte: cambia con el inodo, el tamaño o la fecha de modificación
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def etag_matches(header, etag):
+    # Comparación débil de If-None-Match (RFC 9110, 13.1.2)
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def not_modified(headers, st, etag):
+    # headers: email.message.Message o un dict con claves en minúsculas
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        ims = parsedate_to_datetime(if_modified_since)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return False
+    return ims is not None and ims.tzinfo is not None and int(st.st_mtime) <= ims.timestamp()
+
+def validator_headers(st, etag):
+    return [("Last-Modified", formatdate(st.st_mtime, usegmt=True)), ("ETag", etag)]
+
+def translate_static_path(directory, path):
+    # Misma resolución que SimpleHTTPRequestHandler.translate_path
+    path = path.split('?', 1)[0]
+    path = path.split('#', 1)[0]
+    trailing_slash = path.rstrip().endswith('/')
+    try:
+        path = urllib.parse.unquote(path, errors='surrogatepass')
+    except UnicodeDecodeError:
+        path = urllib.parse.unquote(path)
+    path = posixpath.normpath(path)
+    words = filter(None, path.split('/'))
+    path = directory
+    for word in words:
+        if os.path.dirname(word) or word in (os.curdir, os.pardir):
+            continue
+        path = os.path.join(path, word)
+    if trailing_slash:
+        path += '/'
+    return path
+
+def scan_directory(path):
+    # {nombre: marcas} de las entradas de un directorio
+    entries = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    flags = ENTRY_DIR
+                elif entry.is_file():
+                    flags = ENTRY_FILE
+                else:
+                    flags = ENTRY_OTHER
+                if entry.is_symlink():
+                    flags |= ENTRY_LINK
+            except OSError:
+                flags = ENTRY_OTHER
+            entries[entry.name] = flags
+    return entries
+
+def listing_items(entries):
+    # Líneas <li> de un listado, ya codificadas, en el orden de list_directory
+    enc = sys.getfilesystemencoding()
+    items = []
+    for name in sorted(entries, key=str.lower):
+        displayname = linkname = name
+        if entries[name] & ENTRY_DIR:
+            displayname = name + "/"
+            linkname = name + "/"
+        if entries[name] & ENTRY_LINK:
+            displayname = name + "@"
+        items.append('<li><a href="%s">%s</a></li>' % (
+            urllib.parse.quote(linkname, errors='surrogatepass'),
+            html.escape(displayname, quote=False)))
+    return '\n'.join(items).encode(enc, 'surrogateescape')
+
+def render_directory_listing(fs_path, url_path, items=None):
+    # Mismo HTML que SimpleHTTPRequestHandler.list_directory; None si no se puede listar.
+    # `items` son las líneas ya generadas por DirectoryIndex.listing
+    if items is None:
+        try:
+            items = listing_items(scan_directory(fs_path))
+        except OSError:
+            return None
+    try:
+        displaypath = urllib.parse.unquote(url_path, errors='surrogatepass')
+    except UnicodeDecodeError:
+        displaypath = urllib.parse.unquote(url_path)
+    displaypath = html.escape(displaypath, quote=False)
+    enc = sys.getfilesystemencoding()
+    title = f'Directory listing for {displaypath}'
+    head = '\n'.join([
+        '<!DOCTYPE HTML>',
+        '<html lang="en">',
+        '<head>',
+        f'<meta charset="{enc}">',
+        f'<title>{title}</title>\n</head>',
+        f'<body>\n<h1>{title}</h1>',
+        '<hr>\n<ul>',
+    ]).encode(enc, 'surrogateescape')
+    tail = b'</ul>\n<hr>\n</body>\n</html>\n'
+    if items:
+        return b'\n'.join((head, items, tail)), enc
+    return head + b'\n' + tail, enc
+
+class IndexedDirectory:
+    __slots__ = ("ino", "mtime_ns", "racy", "entries", "listing")
+
+    def __init__(self, st, entries):
+        self.ino = st.st_ino
+        self.mtime_ns = st.st_mtime_ns
+        self.racy = time.time() - st.st_mtime < RACY_WINDOW
+        self.entries = entries
+        self.listing = None
+
+class IndexEvents:
+    # Manejador de watchdog: descarta los directorios afectados por un evento
+    def __init__(self, index):
+        self.index = index
+
+    def dispatch(self, event):
+        if event.event_type not in INDEX_EVENTS:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                path = os.fsdecode(path)
+                self.index.invalidate(os.path.dirname(path))
+                if event.is_directory:
+                    self.index.invalidate(path, subtree=True)
+
+class DirectoryIndex:
+    # Índice en memoria de una raíz estática: entradas de cada directorio (un
+    # dict por directorio, así que consultar una entrada no depende de cuántas
+    # haya), su listado HTML ya generado y las rutas de URL ya traducidas.
+    # Cada directorio se lee la primera vez que se pide y se descarta cuando
+    # cambia: con watchdog al llegar el evento y, sin él, comparando su inodo
+    # y fecha de modificación cada `poll_interval` segundos. Un nombre que no
+    # está en el índice y los listados se comprueban además con un stat del
+    # directorio, para no dar por inexistente algo recién creado.
+    def __init__(self, root, watch=True, poll_interval=DEFAULT_CACHE_SETTINGS["index_poll_interval"],
+                 max_directories=DEFAULT_CACHE_SETTINGS["index_max_directories"]):
+        self.root = os.path.normpath(root)
+        self.watch = watch
+        self.poll_interval = max(0.1, float(poll_interval))
+        self.max_directories = max(1, int(max_directories))
+        self.translate = functools.lru_cache(maxsize=TRANSLATE_CACHE_SIZE)(functools.partial(translate_static_path, root))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._directories = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._observer = None
+        self._poller = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.watch:
+            # Importación diferida: watchdog es opcional y solo hace falta con índice
+            try:
+                from watchdog.observers import Observer
+            except ImportError:
+                Observer = None
+        if self.watch and Observer is not None:
+            observer = Observer()
+            try:
+                observer.schedule(IndexEvents(self), self.root, recursive=True)
+                observer.start()
+            except OSError:
+                # Sin permiso, raíz inexistente o límite de inotify: se sondea
+                observer.stop()
+            else:
+                self._observer = observer
+                return
+        self._poller = threading.Thread(target=self._poll, name="static-index", daemon=True)
+        self._poller.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(self.poll_interval)
+        elif self._poller is not None:
+            self._poller.join(self.poll_interval)
+
+    def isdir(self, path):
+        kind = self._kind(path)
+        return os.path.isdir(path) if kind is None else bool(kind & ENTRY_DIR)
+
+    def isfile(self, path):
+        kind = self._kind(path)
+        return os.path.isfile(path) if kind is None else bool(kind & ENTRY_FILE)
+
+    def exists(self, path):
+        kind = self._kind(path)
+        return os.path.exists(path) if kind is None else kind != 0
+
+    def cached(self, path, listing=False):
+        # True si consultar `path` (o su listado, con listing=True) no tiene que leer el disco
+        path = os.path.normpath(path)
+        if path == self.root and not listing:
+            return True
+        parent, name = (path, None) if listing else os.path.split(path)
+        with self._lock:
+            directory = self._directories.get(parent)
+        if directory is None:
+            return False
+        if listing:
+            return directory.listing is not None and self._unchanged(path, directory)
+        # Un nombre que falta obliga a comprobar (y quizá releer) el directorio
+        return name in directory.entries
+
+    def listing(self, path):
+        # Líneas <li> del listado de `path`; None si no se puede leer
+        path = os.path.normpath(path)
+        directory = self._directory(path)
+        if directory is not None:
+            directory = self._revalidate(path, directory)
+        if directory is None:
+            return None
+        if directory.listing is None:
+            directory.listing = listing_items(directory.entries)
+        return directory.listing
+
+    def invalidate(self, path, subtree=False):
+        path = os.path.normpath(path)
+        with self._lock:
+            self._generation += 1
+            if self._directories.pop(path, None) is not None:
+                self.invalidations += 1
+            if subtree:
+                prefix = os.path.join(path, "")
+                for key in [key for key in self._directories if key.startswith(prefix)]:
+                    del self._directories[key]
+                    self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "directories": len(self._directories),
+            }
+
+    def _kind(self, path):
+        # Marcas de la entrada `path`: 0 si no existe, None si no se sabe
+        path = os.path.normpath(path)
+        if path == self.root:
+            return ENTRY_DIR
+        parent, name = os.path.split(path)
+        directory = self._directory(parent)
+        if directory is None:
+            return None
+        kind = directory.entries.get(name)
+        if kind is None:
+            directory = self._revalidate(parent, directory)
+            if directory is None:
+                return None
+            kind = directory.entries.get(name, 0)
+        return kind
+
+    @staticmethod
+    def _unchanged(path, directory):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return not directory.racy and st.st_ino == directory.ino and st.st_mtime_ns == directory.mtime_ns
+
+    def _revalidate(self, path, directory):
+        # El mismo directorio si no ha cambiado desde que se leyó; si no, se relee
+        if self._unchanged(path, directory):
+            return directory
+        self.invalidate(path)
+        return self._directory(path)
+
+    def _directory(self, path):
+        with self._lock:
+            directory = self._directories.get(path)
+            if directory is not None:
+                self._directories.move_to_end(path)
+                self.hits += 1
+                return directory
+            self.misses += 1
+            generation = self._generation
+        try:
+            st = os.stat(path)
+            directory = IndexedDirectory(st, scan_directory(path))
+        except OSError:
+            return None
+        with self._lock:
+            # Si algo se invalidó mientras se leía, la lectura puede estar ya
+            # desfasada: se usa para esta petición pero no se guarda
+            if generation == self._generation:
+                self._directories[path] = directory
+                if len(self._directories) > self.max_directories:
+                    self._directories.popitem(last=False)
+        return directory
+
+    def _poll(self):
+        while not self._stopped.wait(self.poll_interval):
+            with self._lock:
+                directories = list(self._directories.items())
+            for path, directory in directories:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self.invalidate(path, subtree=True)
+                    continue
+                if directory.racy or st.st_ino != directory.ino or st.st_mtime_ns != directory.mtime_ns:
+                    self.invalidate(path)
+
+class CachedFile:
+    __slots__ = ("mtime_ns", "size", "etag", "body")
+
+    def __init__(self, mtime_ns, size, etag, body):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = etag
+        self.body = body
+
+class FileCache:
+    # LRU de ficheros pequeños indexado por ruta; una entrada solo vale
+    # mientras el fichero conserve su tamaño y fecha de modificación.
+    def __init__(self, max_bytes=DEFAULT_CACHE_SETTINGS["max_bytes"],
+                 max_entry_bytes=DEFAULT_CACHE_SETTINGS["max_entry_bytes"]):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, st):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, path, st, body, etag=None):
+        entry = CachedFile(st.st_mtime_ns, st.st_size, etag or make_etag(st), body)
+        if len(body) > self.max_entry_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[path] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+class StaticFiles:
+    # Decide cómo servir un fichero regular: bytes en caché (pequeños), mmap
+    # (medianos) o el fichero abierto para enviarlo con sendfile (grandes).
+    # Con compresión, elige además entre el hermano .br/.gz precomprimido o
+    # una versión comprimida al vuelo que se guarda en su propia caché.
+    def __init__(self, settings=None, compression=None, root=None):
+        self.settings = cache_settings(settings)
+        self.compression = compression_settings(compression)
+        if root is not None and self.settings["directory_index"]:
+            self.index = DirectoryIndex(
+                root, self.settings["index_watch"], self.settings["index_poll_interval"],
+                self.settings["index_max_directories"]
+            )
+        else:
+            self.index = None
+        if self.settings["enabled"]:
+            self.cache = FileCache(self.settings["max_bytes"], self.settings["max_entry_bytes"])
+        else:
+            self.cache = None
+        if self.compression["enabled"]:
+            self.compressed_cache = FileCache(self.compression["cache_bytes"], self.compression["max_bytes"])
+        else:
+            self.compressed_cache = None
+
+    def start(self):
+        if self.index is not None:
+            self.index.start()
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+
+    def translate(self, directory, path):
+        if self.index is not None:
+            return self.index.translate(path)
+        return translate_static_path(directory, path)
+
+    def isdir(self, path):
+        return self.index.isdir(path) if self.index is not None else os.path.isdir(path)
+
+    def isfile(self, path):
+        return self.index.isfile(path) if self.index is not None else os.path.isfile(path)
+
+    def in_memory(self, path, listing=False):
+        # True si isdir/isfile (o listing, con listing=True) no leen directorios del
+        # disco. Sin índice son un stat, pero el listado siempre lee el directorio
+        if self.index is None:
+            return not listing
+        return self.index.cached(path, listing)
+
+    def listing(self, path, url_path):
+        # (cuerpo, codificación) del listado de un directorio; None si no se puede listar
+        items = self.index.listing(path) if self.index is not None else None
+        return render_directory_listing(path, url_path, items)
+
+    def stats(self):
+        if self.cache is None and self.compressed_cache is None and self.index is None:
+            return None
+        stats = self.cache.stats() if self.cache is not None else {}
+        if self.compressed_cache is not None:
+            stats["compressed"] = self.compressed_cache.stats()
+        if self.index is not None:
+            stats["index"] = self.index.stats()
+        return stats
+
+    def select(self, path, st, content_type, accept_encoding):
+        # Representación a servir: (ruta, stat, codificación o None, etag, vary)
+        if self.compressed_cache is None:
+            return path, st, None, make_etag(st), False
+        accepted = parse_accept_encoding(accept_encoding)
+        compressible = is_compressible(content_type, self.compression["types"])
+        vary = compressible
+        for encoding in ENCODINGS:
+            sibling = path + ENCODING_SUFFIXES[encoding]
+            try:
+                # El índice evita el stat de los hermanos que no existen
+                if self.index is not None and not self.index.exists(sibling):
+                    sibling_st = None
+                else:
+                    sibling_st = os.stat(sibling)
+            except OSError:
+                sibling_st = None
+            if sibling_st is not None and sibling_st.st_mtime_ns >= st.st_mtime_ns:
+                vary = True
+                if accepts(accepted, encoding):
+                    return sibling, sibling_st, encoding, make_etag(sibling_st), True
+            if (compressible and can_compress(encoding) and accepts(accepted, encoding)
+                    and self.compression["min_bytes"] <= st.st_size <= self.compression["max_bytes"]):
+                return path, st, encoding, make_etag(st)[:-1] + f'-{encoding}"', True
+        return path, st, None, make_etag(st), vary
+
+    def compressed(self, path, st, encoding, etag):
+        key = (path, encoding)
+        entry = self.compressed_cache.get(key, st)
+        if entry is not None:
+            return entry.body
+        with open(path, "rb") as f:
+            data = f.read()
+        return self.compressed_cache.put(key, st, compress(data, encoding, self.compression["level"]), etag).body
+
+    def open(self, path, st, allow_mmap=True):
+        # Devuelve (cuerpo, etag); cuerpo es bytes, mmap o un fichero binario abierto
+        if self.cache is not None:
+            entry = self.cache.get(path, st)
+            if entry is not None:
+                return entry.body, entry.etag
+        f = open(path, "rb")
+        try:
+            st = os.fstat(f.fileno())
+            etag = make_etag(st)
+            if self.cache is not None and st.st_size <= self.cache.max_entry_bytes:
+                body = f.read()
+                f.close()
+                return self.cache.put(path, st, body, etag).body, etag
+            if allow_mmap and self.settings["use_mmap"] and 0 < st.st_size <= self.settings["mmap_max_bytes"]:
+                body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                f.close()
+                return body, etag
+        except BaseException:
+            f.close()
+            raise
+        return f, etag
+
+def body_length(body):
+    if isinstance(body, (bytes, mmap.mmap)):
+        return len(body)
+    return os.fstat(body.fileno()).st_size
+
+def close_body(body):
+    if not isinstance(body, bytes):
+        body.close()
+
+def precompress_tree(root, settings=None):
+    # Escribe hermanos .gz (y .br si hay brotli) de los ficheros comprimibles
+    # que no los tengan o cuyo hermano sea más antiguo que el original
+    settings = compression_settings(settings)
+    written = 0
+    encodings = [encoding for encoding in ENCODINGS if can_compress(encoding)]
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(tuple(ENCODING_SUFFIXES.values())):
+                continue
+            path = os.path.join(dirpath, filename)
+            content_type, _ = mimetypes.guess_type(path)
+            if content_type is None or not is_compressible(content_type, settings["types"]):
+                continue
+            try:
+                st = os.stat(path)
+                if st.st_size < settings["min_bytes"]:
+                    continue
+                data = None
+                for encoding in encodings:
+                    sibling = path + ENCODING_SUFFIXES[encoding]
+                    if os.path.exists(sibling) and os.stat(sibling).st_mtime_ns >= st.st_mtime_ns:
+                        continue
+                    if data is None:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    # Máxima compresión: se hace una sola vez, fuera de las peticiones
+                    body = compress(data, encoding, 11 if encoding == "br" else 9)
+                    if len(body) >= len(data):
+                        continue
+                    tmp = sibling + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(body)
+                    os.replace(tmp, sibling)
+                    written += 1
+            except OSError:
+                continue
+    return written
+
+def start_precompress(root, settings=None):
+    thread = threading.Thread(target=precompress_tree, args=(root, settings), name="precompress", daemon=True)
+    thread.start()
+    return thread
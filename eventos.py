@@ -0,0 +1,137 @@
+import json
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+
+# Eventos de petición como registros compactos. Se guardan así en memoria y
+# en el log (una línea JSON por evento); el texto solo se genera al mostrarlos
+# o exportarlos.
+LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_INTERNED = 10000
+# Línea de texto de los logs antiguos y de los exportados
+MESSAGE_RE = re.compile(
+    r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (\S+) (\S+) desde (\S+):(\d+)(?: (\d{3}) ([\d.]+) ms)?$"
+)
+NOTICE_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (.*)$")
+
+class RequestEvent:
+    # ts: segundos desde epoch (time.time()); latency en segundos
+    __slots__ = ("ts", "port", "method", "path", "ip", "client_port", "status", "latency")
+
+    def __init__(self, ts, port, method, path, ip, client_port, status=None, latency=None):
+        self.ts = ts
+        self.port = port
+        self.method = method
+        self.path = path
+        self.ip = ip
+        self.client_port = client_port
+        self.status = status
+        self.latency = latency
+
+class NoticeEvent:
+    # Avisos de texto libre (p. ej. reinicios de procesos prefork)
+    __slots__ = ("ts", "port", "text")
+
+    def __init__(self, ts, port, text):
+        self.ts = ts
+        self.port = port
+        self.text = text
+
+_paths = {}
+_ips = {}
+
+def _intern(table, value):
+    # Los eventos con la misma ruta o IP comparten una única cadena
+    cached = table.get(value)
+    if cached is None:
+        if len(table) >= MAX_INTERNED:
+            table.clear()
+        cached = table.setdefault(value, value)
+    return cached
+
+def intern_path(path):
+    return _intern(_paths, path)
+
+def intern_ip(ip):
+    return _intern(_ips, ip)
+
+def request_event(port, method, path, client_address, status, latency):
+    return RequestEvent(
+        time.time(), port, method, intern_path(path), intern_ip(client_address[0]), client_address[1], status, latency
+    )
+
+def as_event(port, message):
+    if isinstance(message, (RequestEvent, NoticeEvent)):
+        return message
+    return NoticeEvent(time.time(), port, str(message))
+
+# TEXTO
+@lru_cache(maxsize=4096)
+def format_timestamp(second):
+    return datetime.fromtimestamp(second).strftime(LOG_TIMESTAMP_FORMAT)
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp(text):
+    # Los mensajes de un mismo segundo comparten marca de tiempo: se cachea
+    return datetime.strptime(text, LOG_TIMESTAMP_FORMAT).timestamp()
+
+def format_event(event):
+    stamp = f"[{format_timestamp(int(event.ts))}] " if event.ts is not None else ""
+    if type(event) is NoticeEvent:
+        return stamp + event.text
+    text = f"{stamp}{event.method} {event.path} desde {event.ip}:{event.client_port}"
+    if event.status is not None:
+        text += f" {event.status} {(event.latency or 0.0) * 1000:.1f} ms"
+    return text
+
+def search_text(event):
+    # Texto en minúsculas sobre el que buscan los términos libres
+    if type(event) is NoticeEvent:
+        return event.text.lower()
+    return f"{event.method} {event.path} {event.ip} {event.status}".lower()
+
+# LOG EN DISCO
+def encode_event(event):
+    if type(event) is NoticeEvent:
+        record = {"ts": event.ts, "port": event.port, "text": event.text}
+    else:
+        record = {
+            "ts": event.ts, "port": event.port, "method": event.method, "path": event.path,
+            "ip": event.ip, "client_port": event.client_port, "status": event.status, "latency": event.latency,
+        }
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def decode_line(line):
+    # Evento de una línea de log: JSON, o el texto de versiones anteriores
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            if "text" in record:
+                return NoticeEvent(record.get("ts"), record.get("port"), record["text"])
+            return RequestEvent(
+                record.get("ts"), record.get("port"), record["method"], intern_path(record["path"]),
+                intern_ip(record["ip"]), record.get("client_port"), record.get("status"), record.get("latency"),
+            )
+        except (ValueError, KeyError, TypeError):
+            return NoticeEvent(None, None, line)
+    match = MESSAGE_RE.match(line)
+    if match is not None:
+        try:
+            ts = _parse_timestamp(match.group(1))
+        except ValueError:
+            return NoticeEvent(None, None, line)
+        status = int(match.group(6)) if match.group(6) else None
+        latency = float(match.group(7)) / 1000 if match.group(7) else None
+        return RequestEvent(ts, None, match.group(2), intern_path(match.group(3)), intern_ip(match.group(4)),
+                            int(match.group(5)), status, latency)
+    match = NOTICE_RE.match(line)
+    if match is not None:
+        try:
+            return NoticeEvent(_parse_timestamp(match.group(1)), None, match.group(2))
+        except ValueError:
+            pass
+    return NoticeEvent(None, None, line)
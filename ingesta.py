@@ -0,0 +1,232 @@
+import base64
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+from estaticos import merge_settings
+
+# Datos recibidos por POST/PUT en los servidores simples. Cada petición es un
+# registro que pasa por una cola acotada a un hilo escritor; este los añade
+# por lotes a data_<puerto>.jsonl o data_<puerto>.bin.
+INGEST_FORMATS = ("jsonl", "binary")
+INGEST_METHODS = ("POST", "PUT")
+BODY_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_LINE = 1024
+# Formato binario: cabecera fija y después `meta` ("MÉTODO ruta ip") y el cuerpo
+BINARY_RECORD_HEADER = struct.Struct("<dHI")
+
+DEFAULT_INGEST_SETTINGS = {
+    "enabled": False,
+    "format": "jsonl",
+    "data_dir": ".",
+    "queue_size": 10000,
+    "batch_size": 512,
+    "flush_interval": 0.2,
+    "max_body": 1024 * 1024,
+}
+
+def ingest_settings(settings=None):
+    merged = merge_settings(DEFAULT_INGEST_SETTINGS, settings, "ingesta")
+    if merged["format"] not in INGEST_FORMATS:
+        raise ValueError(f"Formato de ingesta desconocido: {merged['format']}")
+    return merged
+
+def data_path(data_dir, port, fmt):
+    return os.path.join(data_dir, f"data_{port}.{'jsonl' if fmt == 'jsonl' else 'bin'}")
+
+class BodyTooLarge(ValueError):
+    pass
+
+# LECTURA DE CUERPOS
+def _chunk_size(line):
+    try:
+        return int(line.split(b";", 1)[0].strip(), 16)
+    except ValueError:
+        raise ValueError(f"Tamaño de bloque inválido: {line[:40]!r}") from None
+
+def _check_size(received, max_body):
+    if received > max_body:
+        raise BodyTooLarge(f"El cuerpo supera {max_body} bytes")
+
+def read_body(rfile, headers, max_body):
+    # Cuerpo completo leído por bloques (Content-Length o chunked); sin
+    # ninguna de las dos cabeceras la petición no lleva cuerpo
+    chunks = []
+    received = 0
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            line = rfile.readline(MAX_CHUNK_LINE)
+            if not line.endswith(b"\n"):
+                raise ValueError("Bloque chunked incompleto")
+            size = _chunk_size(line)
+            if size == 0:
+                break
+            received += size
+            _check_size(received, max_body)
+            while size:
+                data = rfile.read(min(size, BODY_CHUNK_SIZE))
+                if not data:
+                    raise ValueError("Conexión cerrada a mitad del cuerpo")
+                chunks.append(data)
+                size -= len(data)
+            if rfile.readline(MAX_CHUNK_LINE).strip():
+                raise ValueError("Falta el fin de línea tras un bloque chunked")
+        # Cabeceras finales (trailers) hasta la línea vacía
+        while rfile.readline(MAX_CHUNK_LINE).strip():
+            pass
+        return b"".join(chunks)
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise ValueError("Content-Length inválido") from None
+    if length < 0:
+        raise ValueError("Content-Length inválido")
+    _check_size(length, max_body)
+    while received < length:
+        data = rfile.read(min(length - received, BODY_CHUNK_SIZE))
+        if not data:
+            raise ValueError("Conexión cerrada a mitad del cuerpo")
+        chunks.append(data)
+        received += len(data)
+    return b"".join(chunks)
+
+async def read_body_async(reader, headers, max_body):
+    # Igual que read_body sobre un asyncio.StreamReader; headers con claves en minúsculas
+    chunks = []
+    received = 0
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = _chunk_size(await reader.readline())
+            if size == 0:
+                break
+            received += size
+            _check_size(received, max_body)
+            while size:
+                data = await reader.readexactly(min(size, BODY_CHUNK_SIZE))
+                chunks.append(data)
+                size -= len(data)
+            if (await reader.readline()).strip():
+                raise ValueError("Falta el fin de línea tras un bloque chunked")
+        while (await reader.readline()).strip():
+            pass
+        return b"".join(chunks)
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise ValueError("Content-Length inválido") from None
+    if length < 0:
+        raise ValueError("Content-Length inválido")
+    _check_size(length, max_body)
+    while received < length:
+        data = await reader.readexactly(min(length - received, BODY_CHUNK_SIZE))
+        chunks.append(data)
+        received += len(data)
+    return b"".join(chunks)
+
+# REGISTROS
+def encode_jsonl(record):
+    timestamp, method, path, client, content_type, body = record
+    entry = {"ts": timestamp, "method": method, "path": path, "client": client}
+    if content_type:
+        entry["content_type"] = content_type
+    try:
+        entry["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        entry["body"] = base64.b64encode(body).decode("ascii")
+        entry["encoding"] = "base64"
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+def encode_binary(record):
+    timestamp, method, path, client, _, body = record
+    meta = f"{method} {path} {client}".encode("utf-8")[:0xFFFF]
+    return BINARY_RECORD_HEADER.pack(timestamp, len(meta), len(body)) + meta + body
+
+def read_binary_records(path):
+    # Registros de un fichero binario como (ts, meta, cuerpo)
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(BINARY_RECORD_HEADER.size)
+            if len(header) < BINARY_RECORD_HEADER.size:
+                return
+            timestamp, meta_length, body_length = BINARY_RECORD_HEADER.unpack(header)
+            meta = f.read(meta_length).decode("utf-8", errors="replace")
+            yield timestamp, meta, f.read(body_length)
+
+class Ingestor:
+    # Cola acotada y escritor en segundo plano de un puerto. offer() nunca
+    # bloquea: con la cola llena devuelve False y el servidor responde 503.
+    def __init__(self, port, settings):
+        self.port = port
+        self.settings = settings
+        self.path = data_path(settings["data_dir"], port, settings["format"])
+        self._encode = encode_jsonl if settings["format"] == "jsonl" else encode_binary
+        self._queue = queue.Queue(max(1, int(settings["queue_size"])))
+        self.rejected = 0
+        self.written = 0
+        self._fd = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{port}", daemon=True)
+
+    def start(self):
+        os.makedirs(self.settings["data_dir"], exist_ok=True)
+        # O_APPEND y una escritura por lote: los procesos prefork del mismo
+        # puerto pueden compartir el fichero sin mezclar registros
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._thread.start()
+
+    def offer(self, method, path, client, content_type, body):
+        try:
+            self._queue.put_nowait((time.time(), method, path, client, content_type, body))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "rejected": self.rejected,
+            "written": self.written,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        while self._write_batch():
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=self.settings["flush_interval"])
+            except queue.Empty:
+                continue
+            self._write_batch(first)
+
+    def _write_batch(self, first=None):
+        # Escribe hasta batch_size registros de una vez; devuelve cuántos había
+        batch = [] if first is None else [first]
+        while len(batch) < self.settings["batch_size"]:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return 0
+        data = b"".join(self._encode(record) for record in batch)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+        except OSError:
+            pass
+        else:
+            self.written += len(batch)
+        return len(batch)
@@ -0,0 +1,90 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from estaticos import merge_settings
+
+# Límites por cliente de un servidor (config.json, clave "limits"): tasa de
+# peticiones por IP con un token bucket y conexiones simultáneas en total y
+# por IP. Un valor 0 desactiva ese límite.
+DEFAULT_LIMIT_SETTINGS = {
+    "enabled": False,
+    "rate": 20.0,
+    "burst": 40,
+    "max_clients": 10000,
+    "max_connections": 0,
+    "max_connections_per_ip": 0,
+}
+LIMIT_KEYS = ("rate", "burst", "max_clients", "max_connections", "max_connections_per_ip")
+# Motor asyncio: espera máxima a la petición de una conexión que se va a rechazar
+REJECT_TIMEOUT = 2.0
+
+def limit_settings(settings=None):
+    merged = merge_settings(DEFAULT_LIMIT_SETTINGS, settings, "límites")
+    for key in LIMIT_KEYS:
+        value = merged[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"Límite inválido: {key}={value!r}")
+    return merged
+
+def retry_after(settings):
+    # Segundos hasta que una IP sin tokens vuelve a tener uno
+    rate = settings["rate"]
+    return max(1, math.ceil(1 / rate)) if rate else 1
+
+class ClientLimits:
+    # Estado compartido por las conexiones de un servidor. Los tokens de cada
+    # IP van en un OrderedDict usado como LRU: al pasar de max_clients se
+    # olvida la IP que lleva más tiempo sin hacer peticiones.
+    def __init__(self, settings):
+        self.rate = float(settings["rate"])
+        self.burst = max(1.0, float(settings["burst"]))
+        self.max_clients = max(1, int(settings["max_clients"]))
+        self.max_connections = int(settings["max_connections"])
+        self.max_connections_per_ip = int(settings["max_connections_per_ip"])
+        self._buckets = OrderedDict()
+        self._connections = {}
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def connect(self, ip):
+        # Reserva una conexión; False si supera el máximo total o el de su IP
+        with self._lock:
+            count = self._connections.get(ip, 0)
+            if self.max_connections and self._open >= self.max_connections:
+                return False
+            if self.max_connections_per_ip and count >= self.max_connections_per_ip:
+                return False
+            self._connections[ip] = count + 1
+            self._open += 1
+            return True
+
+    def disconnect(self, ip):
+        with self._lock:
+            count = self._connections.get(ip, 0) - 1
+            if count > 0:
+                self._connections[ip] = count
+            else:
+                self._connections.pop(ip, None)
+            self._open -= 1
+
+    def allow(self, ip):
+        # Hasta `burst` peticiones seguidas y `rate` por segundo sostenidas
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(ip)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[ip] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(ip)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                return False
+            bucket[0] -= 1.0
+            return True
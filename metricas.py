@@ -0,0 +1,173 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PATH = "/__metrics"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FOLD_THRESHOLD = 64
+
+class MetricsShard:
+    # Contadores de un único hilo: solo ese hilo los modifica, sin cerrojos
+    __slots__ = ("thread", "statuses", "buckets", "latency_sum", "bytes_sent", "in_flight")
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.bytes_sent = 0
+        self.in_flight = 0
+
+    def merge(self, other):
+        for status, count in dict(other.statuses).items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.latency_sum += other.latency_sum
+        self.bytes_sent += other.bytes_sent
+        self.in_flight += other.in_flight
+
+    def snapshot(self, uptime):
+        return {
+            "uptime": uptime,
+            "requests": sum(self.statuses.values()),
+            "statuses": self.statuses,
+            "buckets": self.buckets,
+            "latency_sum": self.latency_sum,
+            "bytes_sent": self.bytes_sent,
+            "in_flight": self.in_flight,
+        }
+
+class ServerMetrics:
+    # Métricas de un servidor repartidas en un shard por hilo. El camino
+    # caliente solo toca el shard del hilo actual; snapshot() los suma y
+    # pliega en `_retired` los de hilos que ya terminaron.
+    def __init__(self):
+        self.started = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = MetricsShard()
+        self._fold_at = FOLD_THRESHOLD
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = MetricsShard(threading.current_thread())
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) >= self._fold_at:
+                    self._fold_locked()
+                    self._fold_at = max(FOLD_THRESHOLD, 2 * len(self._shards))
+        return shard
+
+    def _fold_locked(self):
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                self._retired.merge(shard)
+        self._shards = alive
+
+    def connection_opened(self):
+        self._shard().in_flight += 1
+
+    def connection_closed(self):
+        self._shard().in_flight -= 1
+
+    def record(self, status, elapsed, sent):
+        shard = self._shard()
+        statuses = shard.statuses
+        statuses[status] = statuses.get(status, 0) + 1
+        shard.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        shard.latency_sum += elapsed
+        shard.bytes_sent += sent
+
+    def snapshot(self):
+        total = MetricsShard()
+        with self._lock:
+            self._fold_locked()
+            total.merge(self._retired)
+            for shard in self._shards:
+                total.merge(shard)
+        return total.snapshot(time.time() - self.started)
+
+def merge_snapshots(snapshots):
+    # Suma de los snapshot() de varios procesos del mismo puerto
+    total = MetricsShard()
+    uptime = 0.0
+    for snapshot in snapshots:
+        for status, count in snapshot["statuses"].items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+        for i, count in enumerate(snapshot["buckets"]):
+            total.buckets[i] += count
+        total.latency_sum += snapshot["latency_sum"]
+        total.bytes_sent += snapshot["bytes_sent"]
+        total.in_flight += snapshot["in_flight"]
+        uptime = max(uptime, snapshot["uptime"])
+    return total.snapshot(uptime)
+
+def percentile(buckets, q):
+    # Estimación por interpolación lineal dentro del bucket; None sin datos
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(buckets):
+        if count and cumulative + count >= rank:
+            lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+            if i == len(LATENCY_BUCKETS):
+                return lower
+            return lower + (LATENCY_BUCKETS[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-1]
+
+def prometheus_text(port, snapshot, cache=None):
+    # Formato de exposición de texto de Prometheus (versión 0.0.4)
+    label = f'port="{port}"'
+    lines = [
+        "# HELP nodofiel_requests_total Peticiones atendidas por código de estado.",
+        "# TYPE nodofiel_requests_total counter",
+    ]
+    for status, count in sorted(snapshot["statuses"].items()):
+        lines.append(f'nodofiel_requests_total{{{label},code="{status}"}} {count}')
+    lines += [
+        "# HELP nodofiel_request_duration_seconds Latencia de las peticiones.",
+        "# TYPE nodofiel_request_duration_seconds histogram",
+    ]
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (None,), snapshot["buckets"]):
+        cumulative += count
+        le = "+Inf" if bound is None else f"{bound:g}"
+        lines.append(f'nodofiel_request_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+    lines += [
+        f'nodofiel_request_duration_seconds_sum{{{label}}} {snapshot["latency_sum"]:.6f}',
+        f'nodofiel_request_duration_seconds_count{{{label}}} {cumulative}',
+        "# HELP nodofiel_response_bytes_total Bytes enviados en respuestas.",
+        "# TYPE nodofiel_response_bytes_total counter",
+        f'nodofiel_response_bytes_total{{{label}}} {snapshot["bytes_sent"]}',
+        "# HELP nodofiel_connections_in_flight Conexiones abiertas.",
+        "# TYPE nodofiel_connections_in_flight gauge",
+        f'nodofiel_connections_in_flight{{{label}}} {snapshot["in_flight"]}',
+    ]
+    if cache:
+        for name in ("hits", "misses", "evictions"):
+            lines += [
+                f"# TYPE nodofiel_cache_{name}_total counter",
+                f'nodofiel_cache_{name}_total{{{label}}} {cache.get(name, 0)}',
+            ]
+    return "\n".join(lines) + "\n"
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+def format_latency(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
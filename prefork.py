@@ -0,0 +1,301 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from metricas import merge_snapshots
+from registro import EventBatcher
+from servidores import (
+    DEFAULT_BACKLOG, DEFAULT_DRAIN_TIMEOUT, DEFAULT_POOL_SIZE, ENGINES, ServerOptionsMixin, create_server
+)
+
+WORKER_EVENT_INTERVAL = 0.05
+WORKER_METRICS_INTERVAL = 1.0
+WORKER_START_TIMEOUT = 30.0
+WORKER_STOP_TIMEOUT = 5.0
+SUPERVISE_INTERVAL = 0.5
+# Un proceso que cae antes de MIN_UPTIME segundos se reinicia con espera creciente
+MIN_UPTIME = 2.0
+MAX_RESTART_DELAY = 30.0
+
+# PROCESO TRABAJADOR
+def apply_commands(server, commands, stop):
+    # Órdenes del proceso principal: rutas nuevas sin reiniciar el trabajador
+    # y parada ordenada con su plazo para las peticiones en curso
+    while True:
+        try:
+            command = commands.get()
+        except (EOFError, OSError):
+            return
+        if command is None:
+            return
+        kind, value = command
+        if kind == "routes":
+            server.set_routes(value)
+        elif kind == "stop":
+            stop(value)
+            return
+
+def worker_main(worker_id, engine, port, server_name, mode, static_dir, options, events, commands, parent_pid):
+    # Se ejecuta con spawn: todo llega como datos simples y el servidor se
+    # reconstruye aquí con create_server, igual que en el proceso principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stopping = threading.Event()
+    drain = {"timeout": DEFAULT_DRAIN_TIMEOUT}
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    def stop(timeout):
+        drain["timeout"] = timeout
+        stopping.set()
+
+    batcher = EventBatcher(lambda batch: events.put(("events", worker_id, batch)), WORKER_EVENT_INTERVAL)
+    try:
+        server = create_server(engine, port, batcher.add, server_name, mode, static_dir, reuse_port=True, **options)
+        server.start()
+    except Exception as e:
+        batcher.close()
+        events.put(("error", worker_id, f"{type(e).__name__}: {e}"))
+        return
+    threading.Thread(target=apply_commands, args=(server, commands, stop), daemon=True).start()
+    events.put(("ready", worker_id, os.getpid()))
+    try:
+        while not stopping.wait(WORKER_METRICS_INTERVAL):
+            events.put(("metrics", worker_id, server.metrics.snapshot(), server.cache_stats()))
+            if os.getppid() != parent_pid:
+                # El proceso principal ha desaparecido: no se deja el puerto ocupado
+                break
+    finally:
+        server.stop(drain["timeout"])
+        server.join(WORKER_STOP_TIMEOUT)
+        batcher.close()
+        events.put(("metrics", worker_id, server.metrics.snapshot(), server.cache_stats()))
+
+# PROCESO PRINCIPAL
+def merge_cache_stats(stats):
+    stats = [entry for entry in stats if entry]
+    if not stats:
+        return None
+    total = {}
+    for entry in stats:
+        for key, value in entry.items():
+            if isinstance(value, dict):
+                total[key] = merge_cache_stats([total.get(key), value])
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+class WorkerMetrics:
+    # Vista agregada de las métricas que envían los trabajadores; conserva
+    # los totales de los procesos que ya terminaron
+    def __init__(self):
+        self._latest = {}
+        self._cache = {}
+        self._retired = []
+        self._lock = threading.Lock()
+
+    def update(self, worker_id, snapshot, cache):
+        with self._lock:
+            self._latest[worker_id] = snapshot
+            self._cache[worker_id] = cache
+
+    def retire(self, worker_id):
+        with self._lock:
+            snapshot = self._latest.pop(worker_id, None)
+            self._cache.pop(worker_id, None)
+            if snapshot is not None:
+                snapshot = dict(snapshot, in_flight=0)
+                self._retired = [merge_snapshots(self._retired + [snapshot])]
+
+    def snapshot(self):
+        with self._lock:
+            return merge_snapshots(self._retired + list(self._latest.values()))
+
+    def cache_stats(self):
+        with self._lock:
+            return merge_cache_stats(list(self._cache.values()))
+
+class PreforkServer(ServerOptionsMixin):
+    # N procesos que escuchan en el mismo puerto con SO_REUSEPORT. Un hilo
+    # recoge sus eventos y métricas de una cola y otro reinicia los procesos
+    # que terminan de forma inesperada.
+    def __init__(self, engine, port, message_callback, server_name, mode, static_dir=None, processes=2,
+                 concurrency="threads", pool_size=DEFAULT_POOL_SIZE, backlog=DEFAULT_BACKLOG, cache=None,
+                 compression=None, keepalive=None, routes=None, ingest=None, limits=None):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("Este sistema no admite SO_REUSEPORT: use un único proceso por puerto")
+        if engine not in ENGINES:
+            raise ValueError(f"Motor de servidor desconocido: {engine}")
+        self.engine = engine
+        # Las opciones se validan aquí para que un error no llegue solo a los
+        # trabajadores; cada proceso crea después sus propios límites y cachés
+        self.setup_options(
+            port, message_callback, server_name, mode, static_dir, concurrency, pool_size, backlog,
+            cache, compression, keepalive, routes, ingest, limits
+        )
+        self.processes = processes
+        self.metrics = WorkerMetrics()
+        self.restarts = 0
+        self._options = {
+            "concurrency": concurrency,
+            "pool_size": pool_size,
+            "backlog": backlog,
+            "cache": self.cache_settings,
+            "compression": self.compression_settings,
+            "keepalive": self.keepalive_settings,
+            "routes": self.routes,
+            "ingest": self.ingest_settings,
+            "limits": self.limit_settings,
+        }
+        self._check_port()
+
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._workers = [None] * processes
+        self._commands = [None] * processes
+        self._started_at = [0.0] * processes
+        self._restart_at = [None] * processes
+        self._delays = [0.0] * processes
+        self._ready = set()
+        self._errors = {}
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        self._collector = threading.Thread(target=self._collect, name=f"prefork-{port}-events", daemon=True)
+        self._supervisor = threading.Thread(target=self._supervise, name=f"prefork-{port}-supervisor", daemon=True)
+
+    def _check_port(self):
+        # Mismo error inmediato que los servidores de un proceso si el puerto está ocupado
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            probe.bind(('0.0.0.0', self.port))
+        finally:
+            probe.close()
+
+    def cache_stats(self):
+        return self.metrics.cache_stats()
+
+    def set_routes(self, routes):
+        # Cada trabajador sustituye su tabla sin reiniciarse; los que arranquen
+        # después reciben las rutas nuevas en sus opciones
+        super().set_routes(routes)
+        self._options["routes"] = self.routes
+        for commands in self._commands:
+            if commands is not None:
+                commands.put(("routes", self.routes))
+
+    def start(self):
+        self._collector.start()
+        for worker_id in range(self.processes):
+            self._spawn(worker_id)
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        with self._cond:
+            while len(self._ready) < self.processes and not self._errors:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            error = next(iter(self._errors.values()), None)
+            ready = len(self._ready)
+        if error is not None or ready < self.processes:
+            self.stop()
+            raise OSError(error or f"Los procesos del puerto {self.port} no arrancaron a tiempo")
+        self._supervisor.start()
+
+    def stop(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        # Cada trabajador para por su cuenta con el mismo plazo; el que no
+        # termine a tiempo recibe SIGTERM y después SIGKILL
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        # El supervisor podría estar lanzando un proceso justo ahora: se
+        # espera a que salga para que la lista de trabajadores ya no cambie
+        if self._supervisor.ident is not None:
+            self._supervisor.join()
+        for process, commands in zip(self._workers, self._commands):
+            if process is not None and process.is_alive():
+                commands.put(("stop", timeout))
+        deadline = time.monotonic() + timeout + WORKER_STOP_TIMEOUT
+        for process in self._workers:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.terminate()
+                    process.join(WORKER_STOP_TIMEOUT)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+        self._events.put(None)
+        if self._collector.is_alive():
+            self._collector.join(WORKER_STOP_TIMEOUT)
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        self._stopped.wait(timeout)
+
+    def is_alive(self):
+        return self._collector.is_alive() and not self._stopped.is_set()
+
+    def _spawn(self, worker_id):
+        commands = self._context.Queue()
+        process = self._context.Process(
+            target=worker_main,
+            args=(worker_id, self.engine, self.port, self.server_name, self.mode, self.static_dir,
+                  self._options, self._events, commands, os.getpid()),
+            name=f"nodofiel-{self.port}-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._commands[worker_id] = commands
+        self._started_at[worker_id] = time.monotonic()
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._events.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            kind, worker_id = item[0], item[1]
+            if kind == "events":
+                if self.message_callback is not None:
+                    for message in item[2]:
+                        self.message_callback(message)
+            elif kind == "metrics":
+                self.metrics.update(worker_id, item[2], item[3])
+            elif kind == "ready":
+                with self._cond:
+                    self._ready.add(worker_id)
+                    self._cond.notify_all()
+            elif kind == "error":
+                with self._cond:
+                    self._errors[worker_id] = item[2]
+                    self._cond.notify_all()
+
+    def _supervise(self):
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            now = time.monotonic()
+            for worker_id, process in enumerate(self._workers):
+                if self._restart_at[worker_id] is not None:
+                    if now >= self._restart_at[worker_id] and not self._stopping.is_set():
+                        self._restart_at[worker_id] = None
+                        self._spawn(worker_id)
+                    continue
+                if process is None or process.is_alive():
+                    continue
+                self.metrics.retire(worker_id)
+                self.restarts += 1
+                if now - self._started_at[worker_id] < MIN_UPTIME:
+                    self._delays[worker_id] = min(MAX_RESTART_DELAY, max(SUPERVISE_INTERVAL, self._delays[worker_id] * 2))
+                else:
+                    self._delays[worker_id] = 0.0
+                self._restart_at[worker_id] = now + self._delays[worker_id]
+                if self.message_callback is not None:
+                    self.message_callback(
+                        f"Proceso {worker_id} del puerto {self.port} terminó (código {process.exitcode}); "
+                        f"se reinicia en {self._delays[worker_id]:.1f} s"
+                    )
@@ -0,0 +1,437 @@
+import glob
+import gzip
+import os
+import threading
+import time
+from datetime import date
+
+from eventos import decode_line, encode_event, format_event
+
+FSYNC_POLICIES = ("never", "batch", "interval")
+ROTATIONS = ("none", "size", "daily")
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_FSYNC_INTERVAL = 5.0
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_REFRESH_HZ = 20
+DEFAULT_MESSAGE_CAPACITY = 10000
+READ_BLOCK_SIZE = 64 * 1024
+TRANSFER_BLOCK_SIZE = 1024 * 1024
+IMPORT_PAGE_LINES = 1000
+# Líneas que se miran en cada paso de la búsqueda binaria por fecha
+SEEK_PROBE_LINES = 16
+
+def log_path(logs_dir, port):
+    # Mismo nombre que los logs de texto de versiones anteriores: los eventos
+    # JSON se añaden tras ellos y decode_line lee los dos formatos
+    return os.path.join(logs_dir, f"servidor_{port}.log")
+
+def read_lines_backwards(path, end, count):
+    # Hasta `count` líneas completas que terminan en el byte `end`, junto con
+    # el desplazamiento donde empieza la primera de ellas
+    if count <= 0 or end <= 0:
+        return [], end
+    with open(path, "rb") as f:
+        pos = end
+        data = b""
+        newlines = 0
+        while pos > 0 and newlines <= count:
+            size = min(READ_BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            block = f.read(size)
+            newlines += block.count(b"\n")
+            data = block + data
+    parts = data.split(b"\n")
+    if parts[-1] == b"":
+        parts.pop()
+    if pos > 0:
+        # La primera parte puede ser una línea cortada
+        parts = parts[1:]
+    parts = parts[-count:]
+    start = end - sum(len(part) + 1 for part in parts)
+    return [part.rstrip(b"\r").decode("utf-8", errors="replace") for part in parts], start
+
+class RingBuffer:
+    # Lista circular de capacidad fija: al llenarse descarta los más antiguos
+    __slots__ = ("capacity", "_items", "_start", "_size")
+
+    def __init__(self, capacity=DEFAULT_MESSAGE_CAPACITY, items=()):
+        self.capacity = max(1, int(capacity))
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self.extend(items)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("RingBuffer index out of range")
+        return self._items[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def append(self, item):
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = item
+            self._size += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def drop_oldest(self, count):
+        count = min(count, self._size)
+        for i in range(count):
+            self._items[(self._start + i) % self.capacity] = None
+        self._start = (self._start + count) % self.capacity
+        self._size -= count
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+class LogWriter:
+    # Escritor de logs en segundo plano: una cola de eventos en memoria y un
+    # fichero JSONL por puerto; los eventos se codifican y vuelcan en lotes al
+    # alcanzar batch_size pendientes o cada flush_interval segundos.
+    def __init__(self, logs_dir, **settings):
+        self.logs_dir = logs_dir
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.fsync = "never"
+        self.fsync_interval = DEFAULT_FSYNC_INTERVAL
+        self.rotation = "none"
+        self.max_bytes = DEFAULT_MAX_BYTES
+        self.backup_count = DEFAULT_BACKUP_COUNT
+        self.configure(**settings)
+
+        self._queues = {}
+        self._pending = 0
+        self._files = {}
+        self._flushed = {}
+        self._last_fsync = time.monotonic()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def configure(self, batch_size=None, flush_interval=None, fsync=None, fsync_interval=None,
+                  rotation=None, max_bytes=None, backup_count=None):
+        if fsync is not None and fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync desconocida: {fsync}")
+        if rotation is not None and rotation not in ROTATIONS:
+            raise ValueError(f"Rotación de logs desconocida: {rotation}")
+        if batch_size is not None:
+            self.batch_size = max(1, int(batch_size))
+        if flush_interval is not None:
+            self.flush_interval = float(flush_interval)
+        if fsync is not None:
+            self.fsync = fsync
+        if fsync_interval is not None:
+            self.fsync_interval = float(fsync_interval)
+        if rotation is not None:
+            self.rotation = rotation
+        if max_bytes is not None:
+            self.max_bytes = int(max_bytes)
+        if backup_count is not None:
+            self.backup_count = int(backup_count)
+
+    def settings(self):
+        return {
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "fsync": self.fsync,
+            "fsync_interval": self.fsync_interval,
+            "rotation": self.rotation,
+            "max_bytes": self.max_bytes,
+            "backup_count": self.backup_count,
+        }
+
+    def log_path(self, port):
+        return log_path(self.logs_dir, port)
+
+    def write(self, port, event):
+        with self._cond:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._queues.setdefault(port, []).append(event)
+                self._pending += 1
+                if self._pending >= self.batch_size:
+                    self._cond.notify()
+        if closed:
+            # Tras close() ya no hay hilo escritor: se escribe directamente
+            with self._io_lock:
+                self._write_batch(port, [event])
+                self._close_file(port)
+
+    def flush(self, port=None):
+        with self._io_lock:
+            self._flush_locked(port)
+
+    def snapshot(self, port):
+        # Vuelca lo pendiente y devuelve (ruta, tamaño, líneas escritas) de forma consistente
+        with self._io_lock:
+            self._flush_locked(port)
+            path = self.log_path(port)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            return path, size, self._flushed.get(port, 0)
+
+    def truncate(self, port):
+        with self._io_lock:
+            with self._cond:
+                self._pending -= len(self._queues.pop(port, []))
+            self._close_file(port)
+            self._flushed[port] = 0
+            open(self.log_path(port), "w", encoding="utf-8").close()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        with self._io_lock:
+            self._flush_locked(None)
+            for port in list(self._files):
+                if self.fsync != "never":
+                    os.fsync(self._files[port][0].fileno())
+                self._close_file(port)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and self._pending < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _flush_locked(self, port):
+        with self._cond:
+            if port is None:
+                batches = self._queues
+                self._queues = {}
+                self._pending = 0
+            else:
+                events = self._queues.pop(port, [])
+                self._pending -= len(events)
+                batches = {port: events}
+        for batch_port, events in batches.items():
+            if events:
+                self._write_batch(batch_port, events)
+        if self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            for f, _ in self._files.values():
+                os.fsync(f.fileno())
+            self._last_fsync = time.monotonic()
+
+    def _write_batch(self, port, events):
+        data = "".join(encode_event(event) for event in events)
+        f = self._file_for(port, len(data))
+        f.write(data)
+        f.flush()
+        self._flushed[port] = self._flushed.get(port, 0) + len(events)
+        if self.fsync == "batch":
+            os.fsync(f.fileno())
+
+    def _file_for(self, port, incoming):
+        path = self.log_path(port)
+        entry = self._files.get(port)
+        if entry is not None:
+            f, opened = entry
+            if self.rotation == "daily" and opened != date.today():
+                self._close_file(port)
+                self._rotate_daily(path, opened)
+                entry = None
+            elif self.rotation == "size" and 0 < f.tell() and f.tell() + incoming > self.max_bytes:
+                self._close_file(port)
+                self._rotate_size(path)
+                entry = None
+        if entry is None:
+            if os.path.exists(path):
+                opened = date.fromtimestamp(os.path.getmtime(path))
+            else:
+                opened = date.today()
+            if self.rotation == "daily" and opened != date.today():
+                self._rotate_daily(path, opened)
+                opened = date.today()
+            f = open(path, "a", encoding="utf-8")
+            self._files[port] = (f, opened)
+        return self._files[port][0]
+
+    def _close_file(self, port):
+        entry = self._files.pop(port, None)
+        if entry is not None:
+            entry[0].close()
+
+    def _rotate_size(self, path):
+        if self.backup_count <= 0:
+            open(path, "w", encoding="utf-8").close()
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+    def _rotate_daily(self, path, opened):
+        if os.path.exists(path):
+            os.replace(path, f"{path}.{opened.isoformat()}")
+        old = sorted(glob.glob(glob.escape(path) + ".????-??-??"))
+        for stale in old[:max(0, len(old) - self.backup_count)]:
+            os.remove(stale)
+
+class EventBatcher:
+    # Acumula eventos desde los hilos de los servidores y los entrega en un
+    # único lote cada `interval` segundos.
+    def __init__(self, deliver, interval=1.0 / DEFAULT_REFRESH_HZ):
+        self.deliver = deliver
+        self.interval = interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-batcher", daemon=True)
+        self._thread.start()
+
+    def add(self, item):
+        with self._lock:
+            self._pending.append(item)
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self._deliver_pending()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._deliver_pending()
+
+    def _deliver_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self.deliver(batch)
+
+# EXPORTACIÓN E IMPORTACIÓN
+class TransferCancelled(Exception):
+    pass
+
+def _check_cancelled(cancelled):
+    if cancelled is not None and cancelled.is_set():
+        raise TransferCancelled("Operación cancelada")
+
+def seek_time(path, ts, after=False):
+    # Desplazamiento desde el que leer para no perder eventos con fecha >= ts
+    # (con after=True, hasta el que leer para incluir los de fecha <= ts);
+    # búsqueda binaria sobre el log, que está ordenado por fecha
+    with open(path, "rb") as f:
+        lo, hi = 0, os.fstat(f.fileno()).st_size
+        while hi - lo > READ_BLOCK_SIZE:
+            mid = (lo + hi) // 2
+            f.seek(mid)
+            f.readline()
+            found = None
+            for _ in range(SEEK_PROBE_LINES):
+                line = f.readline()
+                if not line:
+                    break
+                event = decode_line(line.decode("utf-8", errors="replace"))
+                if event is not None and event.ts is not None:
+                    found = event.ts
+                    break
+            if found is not None and (found <= ts if after else found < ts):
+                lo = mid
+            else:
+                hi = mid
+    # Un bloque de margen: eventos de hilos distintos pueden quedar algo desordenados
+    return hi + READ_BLOCK_SIZE if after else max(0, lo - READ_BLOCK_SIZE)
+
+def _export_lines(lines, query):
+    out = []
+    for line in lines:
+        event = decode_line(line.decode("utf-8", errors="replace"))
+        if event is not None and (query is None or query.matches(event)):
+            out.append(format_event(event) + "\n")
+    return out
+
+def export_log(src_path, dst_path, query=None, compress=False, progress=None, cancelled=None):
+    # Copia como texto, por bloques, los eventos del log que cumplen `query`;
+    # devuelve cuántos se exportaron. Lo escrito después de empezar no se incluye.
+    total = size = os.path.getsize(src_path)
+    start = 0
+    if query is not None and query.since is not None:
+        start = seek_time(src_path, query.since)
+    if query is not None and query.until is not None:
+        total = min(size, seek_time(src_path, query.until, after=True))
+    opener = gzip.open if compress else open
+    exported = 0
+    try:
+        with open(src_path, "rb") as fsrc, opener(dst_path, "wt", encoding="utf-8") as fdst:
+            fsrc.seek(start)
+            if start:
+                # La primera línea puede estar cortada
+                fsrc.readline()
+            pos = fsrc.tell()
+            pending = b""
+            while pos < total:
+                _check_cancelled(cancelled)
+                block = fsrc.read(min(TRANSFER_BLOCK_SIZE, total - pos))
+                if not block:
+                    break
+                pos += len(block)
+                lines = (pending + block).split(b"\n")
+                pending = lines.pop()
+                out = _export_lines(lines, query)
+                fdst.writelines(out)
+                exported += len(out)
+                if progress is not None:
+                    progress(pos, total)
+            # Si se para antes del final, la última línea puede estar cortada
+            out = _export_lines([pending], query) if pending.strip() and pos >= size else []
+            fdst.writelines(out)
+            exported += len(out)
+    except BaseException:
+        try:
+            os.remove(dst_path)
+        except OSError:
+            pass
+        raise
+    return exported
+
+def import_tail(path, count, progress=None, cancelled=None):
+    # Eventos de las últimas `count` líneas de un log, leídas hacia atrás por
+    # páginas; las anteriores se quedan en disco y se cargan al desplazarse
+    end = os.path.getsize(path)
+    pages = []
+    loaded = 0
+    while loaded < count and end > 0:
+        _check_cancelled(cancelled)
+        lines, end = read_lines_backwards(path, end, min(IMPORT_PAGE_LINES, count - loaded))
+        if not lines:
+            break
+        pages.append(lines)
+        loaded += len(lines)
+        if progress is not None:
+            progress(loaded, count)
+    events = []
+    for lines in reversed(pages):
+        events.extend(event for event in map(decode_line, lines) if event is not None)
+    return events
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import threading
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+
+# Rutas de los servidores simples (config.json, clave "routes"):
+#   {"path": "/health", "body": "ok"}
+#   {"method": "GET", "path": "/logo.png", "type": "file", "file": "/srv/logo.png"}
+#   {"path": "/users/{id}", "type": "json", "template": {"id": "{id}", "activo": true}}
+ROUTE_TYPES = ("body", "file", "json")
+ROUTE_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+ROUTE_KEYS = ("method", "path", "type", "status", "content_type", "headers", "body", "file", "template")
+PARAM_RE = re.compile(r"\{(\w+)\}")
+DEFAULT_CONTENT_TYPES = {
+    "body": "text/plain; charset=utf-8",
+    "file": "application/octet-stream",
+    "json": "application/json",
+}
+
+class DateHeader:
+    # Cabecera Date ya codificada; solo se vuelve a formatear al cambiar el segundo
+    def __init__(self):
+        self._cached = (0, b"")
+
+    def line(self):
+        now = int(time.time())
+        second, line = self._cached
+        if second != now:
+            line = f"Date: {formatdate(now, usegmt=True)}\r\n".encode("latin-1")
+            self._cached = (now, line)
+        return line
+
+date_header = DateHeader()
+
+def _json_fragment(value):
+    # Valor de un parámetro escapado para ir dentro de una cadena JSON
+    return json.dumps(value)[1:-1]
+
+class Route:
+    # Respuesta precodificada: `prefix` (línea de estado y Server), `headers`
+    # (cabeceras propias de la ruta) y `body`. Solo Date y las cabeceras de
+    # conexión se añaden en cada petición.
+    __slots__ = ("method", "path", "kind", "status", "prefix", "headers", "body", "file", "file_key",
+                 "file_body", "template", "params", "_lock")
+
+    def __init__(self, entry, protocol, server_header):
+        unknown = set(entry) - set(ROUTE_KEYS)
+        if unknown:
+            raise ValueError(f"Opciones de ruta desconocidas: {', '.join(sorted(unknown))}")
+        self.path = entry.get("path")
+        if not isinstance(self.path, str) or not self.path.startswith("/"):
+            raise ValueError(f"Ruta inválida: {self.path!r}")
+        self.method = entry.get("method", "GET").upper()
+        if self.method not in ROUTE_METHODS:
+            raise ValueError(f"Método de ruta no admitido: {self.method}")
+        self.kind = entry.get("type", "body")
+        if self.kind not in ROUTE_TYPES:
+            raise ValueError(f"Tipo de ruta desconocido: {self.kind}")
+        self.status = HTTPStatus(entry.get("status", 200))
+        self.params = PARAM_RE.findall(self.path)
+        self.prefix = f"{protocol} {self.status.value} {self.status.phrase}\r\nServer: {server_header}\r\n".encode("latin-1")
+        default_type = DEFAULT_CONTENT_TYPES["json" if not isinstance(entry.get("body", ""), str) else self.kind]
+        headers = [("Content-Type", entry.get("content_type", default_type))]
+        headers.extend((entry.get("headers") or {}).items())
+        self.headers = "".join(f"{name}: {value}\r\n" for name, value in headers).encode("latin-1")
+        self.body = None
+        self.file = None
+        self.file_key = None
+        self.file_body = None
+        self.template = None
+        self._lock = threading.Lock()
+
+        if self.kind == "body":
+            body = entry.get("body", "")
+            self.body = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        elif self.kind == "file":
+            self.file = entry.get("file")
+            if not self.file:
+                raise ValueError(f"La ruta {self.path} no indica el fichero a servir")
+        else:
+            text = json.dumps(entry.get("template"), ensure_ascii=False)
+            # Texto JSON troceado: literales en las posiciones pares, parámetros en las impares
+            self.template = PARAM_RE.split(text)
+            if len(self.template) == 1:
+                self.body = text.encode("utf-8")
+        if self.body is not None:
+            self.headers += f"Content-Length: {len(self.body)}\r\n".encode("latin-1")
+
+    def render(self, params):
+        # (cabeceras propias, cuerpo) de esta petición
+        if self.body is not None:
+            return self.headers, self.body
+        if self.kind == "file":
+            return self._file_response()
+        parts = self.template[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = _json_fragment(params.get(parts[i], ""))
+        body = "".join(parts).encode("utf-8")
+        return self.headers + f"Content-Length: {len(body)}\r\n".encode("latin-1"), body
+
+    def _file_response(self):
+        # El fichero se relee solo si cambia su tamaño o fecha de modificación
+        st = os.stat(self.file)
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if self.file_key != key:
+                with open(self.file, "rb") as f:
+                    data = f.read()
+                self.file_key = key
+                self.file_body = (self.headers + f"Content-Length: {len(data)}\r\n".encode("latin-1"), data)
+            return self.file_body
+
+class RouteTable:
+    # Rutas fijas en un diccionario (método, ruta); las que llevan parámetros
+    # se unen en una sola expresión regular por método
+    def __init__(self, routes=(), protocol="HTTP/1.0", server_header="", default=None):
+        self.routes = [Route(entry, protocol, server_header) for entry in routes or ()]
+        # Respuesta de GET/HEAD cuando ninguna ruta coincide
+        self.default = Route(default, protocol, server_header) if default is not None else None
+        self._exact = {}
+        self._patterns = {}
+        dynamic = {}
+        for route in self.routes:
+            if route.params:
+                dynamic.setdefault(route.method, []).append(route)
+            else:
+                self._exact.setdefault((route.method, route.path), route)
+        for method, routes in dynamic.items():
+            alternatives = []
+            groups = {}
+            group = 0
+            for route in routes:
+                group += 1
+                outer = group
+                pattern = ""
+                names = []
+                for i, piece in enumerate(PARAM_RE.split(route.path)):
+                    if i % 2:
+                        group += 1
+                        names.append((piece, group))
+                        pattern += "([^/]+)"
+                    else:
+                        pattern += re.escape(piece)
+                alternatives.append(f"({pattern})")
+                groups[outer] = (route, names)
+            self._patterns[method] = (re.compile("(?:" + "|".join(alternatives) + r")\Z"), groups)
+
+    def match(self, method, path):
+        # (ruta, parámetros) o None; HEAD usa las rutas GET
+        path = path.split("?", 1)[0]
+        if method == "HEAD":
+            method = "GET"
+        route = self._exact.get((method, path))
+        if route is not None:
+            return route, {}
+        entry = self._patterns.get(method)
+        found = entry[0].match(path) if entry is not None else None
+        if found is None:
+            if method == "GET" and self.default is not None:
+                return self.default, {}
+            return None
+        groups = entry[1]
+        # El grupo exterior de la alternativa que coincide es el último en cerrarse
+        route, names = groups[found.lastindex]
+        return route, {name: found.group(index) for name, index in names}
+
+def encode_response(route, params, connection_headers=(), head_only=False):
+    # Respuesta completa lista para escribir de una vez
+    headers, body = route.render(params)
+    parts = [route.prefix, date_header.line()]
+    parts.extend(f"{name}: {value}\r\n".encode("latin-1") for name, value in connection_headers)
+    parts.append(headers)
+    parts.append(b"\r\n")
+    if not head_only:
+        parts.append(body)
+    return b"".join(parts)
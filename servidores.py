@@ -0,0 +1,832 @@
+import mmap
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer, SimpleHTTPRequestHandler
+from estaticos import (
+    StaticFiles, body_length, cache_settings, close_body, compression_settings, merge_settings, not_modified,
+    start_precompress, validator_headers
+)
+from eventos import request_event
+from ingesta import INGEST_METHODS, BodyTooLarge, Ingestor, ingest_settings, read_body
+from limites import ClientLimits, limit_settings, retry_after
+from metricas import METRICS_PATH, PROMETHEUS_CONTENT_TYPE, ServerMetrics, prometheus_text
+from rutas import Route, RouteTable, encode_response
+
+ENGINES = ("threaded", "asyncio")
+DEFAULT_ENGINE = "threaded"
+CONCURRENCY_MODES = ("threads", "pool")
+DEFAULT_POOL_SIZE = 32
+DEFAULT_BACKLOG = 128
+MAX_HEADER_BYTES = 65536
+INDEX_PAGES = ("index.html", "index.htm")
+# Al parar: plazo para las peticiones en curso y espera extra tras cerrar las que queden
+DEFAULT_DRAIN_TIMEOUT = 5.0
+DRAIN_ABORT_WAIT = 1.0
+# Plazo de lectura de las conexiones del pool sin keep-alive
+POOL_READ_TIMEOUT = 30.0
+
+DEFAULT_KEEPALIVE_SETTINGS = {
+    "enabled": False,
+    "timeout": 5.0,
+    "max_requests": 100,
+}
+
+def keepalive_settings(settings=None):
+    return merge_settings(DEFAULT_KEEPALIVE_SETTINGS, settings, "keep-alive")
+
+def simple_response_text(port):
+    return f"Hola desde servidor en puerto {port}"
+
+def abort_connection(sock):
+    # Despierta al hilo que lee o escribe en el socket; él lo cierra después
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+def has_request_body(headers):
+    # headers: email.message.Message o un dict con claves en minúsculas
+    return "transfer-encoding" in headers or headers.get("content-length", "0").strip() not in ("", "0")
+
+def connection_headers(settings, keep_alive, request_version, served):
+    # Cabeceras Connection/Keep-Alive de una respuesta en modo HTTP/1.1
+    if not keep_alive:
+        return [("Connection", "close")]
+    headers = [("Keep-Alive", f"timeout={settings['timeout']:g}, max={settings['max_requests'] - served}")]
+    if request_version == "HTTP/1.0":
+        headers.insert(0, ("Connection", "keep-alive"))
+    return headers
+
+def _route_protocol(keepalive):
+    return (
+        "HTTP/1.1" if keepalive["enabled"] else "HTTP/1.0",
+        f"{BaseHTTPRequestHandler.server_version} {BaseHTTPRequestHandler.sys_version}",
+    )
+
+def route_table(routes, port, keepalive):
+    # Tabla de rutas del modo simple; el saludo de siempre queda como respuesta por defecto
+    return RouteTable(
+        routes, *_route_protocol(keepalive),
+        default={"path": "/", "body": simple_response_text(port), "content_type": "text/plain"},
+    )
+
+def ingest_responses(keepalive):
+    # Respuestas precodificadas de la ingesta: aceptado y cola llena
+    protocol, server_header = _route_protocol(keepalive)
+    accepted = Route({"path": "/", "status": HTTPStatus.ACCEPTED}, protocol, server_header)
+    busy = Route(
+        {"path": "/", "status": HTTPStatus.SERVICE_UNAVAILABLE, "body": "Cola de datos llena",
+         "headers": {"Retry-After": "1"}},
+        protocol, server_header,
+    )
+    return accepted, busy
+
+def limit_responses(keepalive, limits):
+    # Respuestas precodificadas de los límites por cliente: demasiadas
+    # peticiones de una IP y demasiadas conexiones abiertas
+    protocol, server_header = _route_protocol(keepalive)
+    too_many_requests = Route(
+        {"path": "/", "status": HTTPStatus.TOO_MANY_REQUESTS, "body": "Demasiadas peticiones",
+         "headers": {"Retry-After": str(retry_after(limits))}},
+        protocol, server_header,
+    )
+    too_many_connections = Route(
+        {"path": "/", "status": HTTPStatus.SERVICE_UNAVAILABLE, "body": "Demasiadas conexiones",
+         "headers": {"Retry-After": "1"}},
+        protocol, server_header,
+    )
+    return too_many_requests, too_many_connections
+
+def client_limits(settings):
+    return ClientLimits(settings) if settings["enabled"] else None
+
+def metrics_body(port, metrics, static_files):
+    cache = static_files.stats() if static_files is not None else None
+    return prometheus_text(port, metrics.snapshot(), cache).encode()
+
+# HANDLERS
+class CountingWriter:
+    # Envoltorio de wfile que cuenta los bytes escritos
+    __slots__ = ("raw", "written")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.written = 0
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+    def write(self, data):
+        self.written += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        self.raw.close()
+
+    def take(self):
+        written, self.written = self.written, 0
+        return written
+
+class MetricsMixin:
+    # Estado, latencia y bytes de cada respuesta en server.metrics; también
+    # atiende METRICS_PATH en formato Prometheus
+    def setup(self):
+        super().setup()
+        self._metrics = getattr(self.server, 'metrics', None)
+        if self._metrics is not None:
+            self.wfile = CountingWriter(self.wfile)
+            self._metrics.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            if self._metrics is not None:
+                self._metrics.connection_closed()
+
+    def handle_one_request(self):
+        self._status = None
+        self._started = None
+        self._log_event = False
+        super().handle_one_request()
+        if self._status is None:
+            return
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        if self._metrics is not None:
+            self._metrics.record(self._status, elapsed, self.wfile.take())
+        self.request_done(self._status, elapsed)
+
+    def request_done(self, status, elapsed):
+        # El evento se crea al terminar la respuesta, con su estado y latencia
+        if self._log_event and getattr(self.server, 'callback', None) is not None:
+            self.server.callback(request_event(
+                self.server.server_port, self.command, self.path, self.client_address, status, elapsed
+            ))
+
+    def parse_request(self):
+        self._started = time.perf_counter()
+        return super().parse_request()
+
+    def send_response_only(self, code, message=None):
+        self._status = int(code)
+        super().send_response_only(code, message)
+
+    def sendfile(self, f):
+        sent = self.connection.sendfile(f)
+        if self._metrics is not None:
+            self.wfile.written += sent
+        return sent
+
+    def is_metrics_request(self):
+        return self._metrics is not None and self.path.split('?', 1)[0] == METRICS_PATH
+
+    def send_metrics(self, head_only=False):
+        body = metrics_body(self.server.server_port, self._metrics, getattr(self.server, 'static_files', None))
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+class KeepAliveMixin:
+    # HTTP/1.1 opcional (server.keepalive): conexiones persistentes con un
+    # tiempo máximo de inactividad y un máximo de peticiones por conexión
+    reads_body = False
+
+    def setup(self):
+        settings = getattr(self.server, 'keepalive', None)
+        self._keepalive = settings if settings is not None and settings["enabled"] else None
+        self._served = 0
+        if self._keepalive is not None:
+            self.protocol_version = "HTTP/1.1"
+            self.timeout = self._keepalive["timeout"]
+            # Cabeceras y cuerpo van en escrituras separadas: sin Nagle no esperan al ACK
+            self.disable_nagle_algorithm = True
+        super().setup()
+
+    def handle_one_request(self):
+        self._connection_sent = False
+        # Esperando la siguiente petición, la conexión se puede cerrar al parar el servidor
+        self._mark_idle(True)
+        super().handle_one_request()
+
+    def _mark_idle(self, idle):
+        mark = getattr(self.server, 'mark_idle', None)
+        if mark is not None:
+            mark(self.request, idle, self._served > 0)
+
+    def parse_request(self):
+        self._mark_idle(False)
+        if not super().parse_request():
+            return False
+        if self._keepalive is not None:
+            self._served += 1
+            # Un cuerpo que el handler no va a leer desincronizaría la siguiente petición
+            if self._served >= self._keepalive["max_requests"] or (
+                    not self.reads_body and has_request_body(self.headers)):
+                self.close_connection = True
+        return True
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self._connection_sent = True
+        super().send_header(keyword, value)
+
+    def keepalive_headers(self):
+        if self._keepalive is None or self.request_version == 'HTTP/0.9':
+            return []
+        return connection_headers(self._keepalive, not self.close_connection, self.request_version, self._served)
+
+    def end_headers(self):
+        if not self._connection_sent:
+            for name, value in self.keepalive_headers():
+                super().send_header(name, value)
+        super().end_headers()
+
+class LimitsMixin:
+    # Tasa por IP (server.limits): una petición sin tokens recibe 429, se
+    # registra como evento y cierra la conexión, porque su cuerpo queda sin
+    # leer. El máximo de conexiones lo aplica ConnectionCapMixin al aceptar.
+    def setup(self):
+        self._limits = getattr(self.server, 'limits', None)
+        super().setup()
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self._limits is None or self._limits.allow(self.client_address[0]):
+            return True
+        route = self.server.too_many_requests
+        self.close_connection = True
+        self._status = route.status.value
+        self._log_event = True
+        self.wfile.write(encode_response(route, {}, (("Connection", "close"),), self.command == "HEAD"))
+        return False
+
+class CustomStaticHandler(MetricsMixin, KeepAliveMixin, LimitsMixin, SimpleHTTPRequestHandler):
+    def __init__(self, *args, directory=None, **kwargs):
+        self._custom_directory = directory
+        super().__init__(*args, directory=directory, **kwargs)
+
+    def do_GET(self):
+        if self.is_metrics_request():
+            self.send_metrics()
+            return
+        body = self.send_head()
+        if body is not None:
+            try:
+                if isinstance(body, (bytes, mmap.mmap)):
+                    self.wfile.write(body)
+                else:
+                    # os.sendfile cuando el sistema lo permite, si no copia por bloques
+                    self.sendfile(body)
+            finally:
+                close_body(body)
+
+    def do_HEAD(self):
+        if self.is_metrics_request():
+            self.send_metrics(head_only=True)
+            return
+        body = self.send_head()
+        if body is not None:
+            close_body(body)
+
+    def translate_path(self, path):
+        static_files = getattr(self.server, 'static_files', None)
+        if static_files is None:
+            return super().translate_path(path)
+        return static_files.translate(self.directory, path)
+
+    def list_directory(self, path):
+        static_files = getattr(self.server, 'static_files', None)
+        listing = static_files.listing(path, self.path) if static_files is not None else None
+        if listing is None:
+            return super().list_directory(path)
+        body, enc = listing
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-type", f"text/html; charset={enc}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+
+    def send_head(self):
+        static_files = getattr(self.server, 'static_files', None)
+        path = self.translate_path(self.path)
+        if static_files is None:
+            return super().send_head()
+        if static_files.isdir(path):
+            if not urllib.parse.urlsplit(self.path).path.endswith('/'):
+                return super().send_head()
+            for index in INDEX_PAGES:
+                index_path = os.path.join(path, index)
+                if static_files.isfile(index_path):
+                    path = index_path
+                    break
+            else:
+                return self.list_directory(path)
+        if path.endswith('/'):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        content_type = self.guess_type(path)
+        serve_path, serve_st, encoding, etag, vary = static_files.select(
+            path, st, content_type, self.headers.get("Accept-Encoding")
+        )
+        headers = validator_headers(st, etag)
+        if vary:
+            headers.append(("Vary", "Accept-Encoding"))
+        if not_modified(self.headers, st, etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return None
+        try:
+            if encoding is not None and serve_path == path:
+                body = static_files.compressed(path, st, encoding, etag)
+            else:
+                body, _ = static_files.open(serve_path, serve_st)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(body_length(body)))
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        return body
+
+    def log_message(self, format, *args):
+        return
+
+class CustomSimpleHandler(MetricsMixin, KeepAliveMixin, LimitsMixin, BaseHTTPRequestHandler):
+    # El cuerpo se lee siempre antes de atender la petición, así la conexión
+    # puede seguir abierta aunque la respuesta no lo use
+    reads_body = True
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        try:
+            self.body = read_body(self.rfile, self.headers, self.server.ingest_settings["max_body"])
+        except BodyTooLarge as e:
+            self.close_connection = True
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+            return False
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return False
+        return True
+
+    def do_GET(self):
+        if self.is_metrics_request():
+            self.send_metrics()
+            return
+        self.send_route()
+
+    def do_HEAD(self):
+        if self.is_metrics_request():
+            self.send_metrics(head_only=True)
+            return
+        self.send_route(head_only=True)
+
+    def do_POST(self):
+        self.send_route()
+
+    do_PUT = do_PATCH = do_DELETE = do_POST
+
+    def send_route(self, head_only=False):
+        found = self.server.routes.match(self.command, self.path)
+        if found is None:
+            if self.server.ingestor is not None and self.command in INGEST_METHODS:
+                self.ingest()
+                return
+            self.send_error(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({self.command!r})")
+            return
+        route, params = found
+        try:
+            data = encode_response(route, params, self.keepalive_headers(), head_only)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        # La respuesta ya va codificada: el estado se anota aquí para las métricas
+        self._status = route.status.value
+        self._log_event = True
+        self.wfile.write(data)
+
+    def ingest(self):
+        accepted = self.server.ingestor.offer(
+            self.command, self.path, self.client_address[0], self.headers.get("Content-Type"), self.body
+        )
+        route = self.server.ingest_accepted if accepted else self.server.ingest_busy
+        self._status = route.status.value
+        self._log_event = accepted
+        self.wfile.write(encode_response(route, {}, self.keepalive_headers()))
+
+    def log_message(self, format, *args):
+        return
+
+# SERVIDORES
+class ReusePortMixin:
+    # Con reuse_port varios procesos escuchan en el mismo puerto (SO_REUSEPORT)
+    reuse_port = False
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+class ConnectionCapMixin:
+    # Máximo de conexiones en total y por IP (server.limits), comprobado en el
+    # hilo que acepta: una conexión rechazada recibe el 503 ya codificado y se
+    # cierra sin ocupar un hilo ni un puesto del pool
+    def __init__(self, *args, **kwargs):
+        self._capped = {}
+        self._capped_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def verify_request(self, request, client_address):
+        limits = getattr(self, 'limits', None)
+        if limits is not None:
+            if not limits.connect(client_address[0]):
+                self.reject_connection(request, client_address)
+                return False
+            with self._capped_lock:
+                self._capped[request] = client_address[0]
+        return super().verify_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._capped_lock:
+            ip = self._capped.pop(request, None)
+        if ip is not None:
+            self.limits.disconnect(ip)
+        super().shutdown_request(request)
+
+    def reject_connection(self, request, client_address):
+        # Sin esperar a nada: se lee lo que ya haya llegado (la línea de la
+        # petición va al registro y así el cierre no acaba en RST) y el 503
+        # cabe de sobra en el búfer de envío
+        method = path = "-"
+        request.setblocking(False)
+        try:
+            words = request.recv(MAX_HEADER_BYTES).split(b"\r\n", 1)[0].decode("iso-8859-1").split()
+            if len(words) >= 2:
+                method, path = words[0], words[1]
+        except OSError:
+            pass
+        route = self.too_many_connections
+        data = encode_response(route, {}, (("Connection", "close"),), method == "HEAD")
+        try:
+            sent = request.send(data)
+        except OSError:
+            sent = 0
+        metrics = getattr(self, 'metrics', None)
+        if metrics is not None:
+            metrics.record(route.status.value, 0.0, sent)
+        if getattr(self, 'callback', None) is not None:
+            self.callback(request_event(self.server_port, method, path, client_address, route.status.value, 0.0))
+
+class DrainMixin:
+    # Conexiones abiertas y si están inactivas, para parar sin cortar
+    # peticiones en curso. drain() sustituye a la espera sin plazo de
+    # ThreadingMixIn.server_close.
+    block_on_close = False
+
+    def __init__(self, *args, **kwargs):
+        self._open = {}
+        self._kept_alive = set()
+        self._aborted = set()
+        self._open_cond = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def verify_request(self, request, client_address):
+        # Primer punto común de ThreadingMixIn y del pool tras aceptar una conexión
+        with self._open_cond:
+            self._open[request] = False
+        return super().verify_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._open_cond:
+            self._open.pop(request, None)
+            self._kept_alive.discard(request)
+            self._aborted.discard(request)
+            self._open_cond.notify_all()
+        super().shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # Los errores de una conexión cerrada por drain() son esperados
+        if request not in self._aborted:
+            super().handle_error(request, client_address)
+
+    def mark_idle(self, request, idle, kept_alive=False):
+        # kept_alive: la conexión ya atendió alguna petición y espera la siguiente
+        with self._open_cond:
+            if request in self._open:
+                self._open[request] = idle
+                if idle:
+                    if kept_alive:
+                        self._kept_alive.add(request)
+                    self._open_cond.notify_all()
+                else:
+                    self._kept_alive.discard(request)
+
+    def close_idle(self):
+        # Cierra la conexión persistente inactiva más antigua; False si no hay ninguna
+        with self._open_cond:
+            for request in self._open:
+                if request in self._kept_alive and self._open[request] and request not in self._aborted:
+                    self._aborted.add(request)
+                    abort_connection(request)
+                    return True
+        return False
+
+    def drain(self, timeout):
+        # Cierra las conexiones inactivas enseguida y el resto al vencer el plazo
+        deadline = time.monotonic() + timeout
+        with self._open_cond:
+            while self._open:
+                now = time.monotonic()
+                if now >= deadline + DRAIN_ABORT_WAIT:
+                    break
+                for request, idle in self._open.items():
+                    if (idle or now >= deadline) and request not in self._aborted:
+                        self._aborted.add(request)
+                        abort_connection(request)
+                self._open_cond.wait((deadline if now < deadline else deadline + DRAIN_ABORT_WAIT) - now)
+
+class BacklogThreadingHTTPServer(DrainMixin, ConnectionCapMixin, ReusePortMixin, ThreadingHTTPServer):
+    # Un hilo por conexión, con cola de aceptación configurable
+    def __init__(self, server_address, handler_class, backlog=DEFAULT_BACKLOG, reuse_port=False):
+        self.request_queue_size = backlog
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+
+class PooledHTTPServer(DrainMixin, ConnectionCapMixin, ReusePortMixin, HTTPServer):
+    # Conexiones atendidas por un pool fijo de hilos. Con el pool lleno, las
+    # conexiones nuevas esperan en una cola propia (hasta `backlog`) y las
+    # recoge el primer hilo que queda libre; el hilo que acepta no se bloquea
+    # nunca. Una conexión persistente ocupa su hilo mientras espera la
+    # siguiente petición, así que al encolar se cierra la inactiva más antigua
+    # (como permite HTTP/1.1) para dejar paso a la nueva. Con la cola también
+    # llena se responde 503.
+
+    def __init__(self, server_address, handler_class, pool_size=DEFAULT_POOL_SIZE, backlog=DEFAULT_BACKLOG,
+                 reuse_port=False):
+        self.request_queue_size = backlog
+        self.reuse_port = reuse_port
+        self.pool_size = pool_size
+        self._busy = 0
+        self._pending = deque()
+        self._pool_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="http-pool")
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        with self._pool_lock:
+            start = self._busy < self.pool_size
+            if start:
+                self._busy += 1
+            elif len(self._pending) < self.request_queue_size:
+                self._pending.append((request, client_address))
+                queued = True
+            else:
+                queued = False
+        if not start:
+            if queued:
+                self.close_idle()
+            else:
+                self.reject_connection(request, client_address)
+                self.shutdown_request(request)
+            return
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            with self._pool_lock:
+                self._busy -= 1
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        # Atiende conexiones hasta vaciar la cola de espera
+        while request is not None:
+            try:
+                # Sin keep-alive el handler no pone plazo de lectura: un cliente
+                # que no envía nada no retiene el hilo indefinidamente
+                request.settimeout(POOL_READ_TIMEOUT)
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+            with self._pool_lock:
+                if self._pending:
+                    request, client_address = self._pending.popleft()
+                else:
+                    self._busy -= 1
+                    request = None
+
+    def server_close(self):
+        super().server_close()
+        # Las conexiones en cola no han empezado ninguna petición
+        with self._pool_lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for request, client_address in pending:
+            self.shutdown_request(request)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class ServerOptionsMixin:
+    # Opciones comunes a los tres servidores (hilos, asyncio y prefork) y
+    # objetos propios de cada proceso que atiende conexiones. Una opción
+    # nueva se añade aquí, en server_options y en server_config.
+    processes = 1
+
+    def setup_options(self, port, message_callback, server_name, mode, static_dir, concurrency, pool_size,
+                      backlog, cache, compression, keepalive, routes, ingest, limits):
+        if concurrency not in CONCURRENCY_MODES:
+            raise ValueError(f"Modo de concurrencia desconocido: {concurrency}")
+        self.port = port
+        self.message_callback = message_callback
+        self.server_name = server_name
+        self.mode = mode
+        self.static_dir = static_dir
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.backlog = backlog
+        self.cache_settings = cache_settings(cache)
+        self.compression_settings = compression_settings(compression)
+        self.keepalive_settings = keepalive_settings(keepalive)
+        self.routes = list(routes or [])
+        self.route_table = route_table(self.routes, port, self.keepalive_settings)
+        self.ingest_settings = ingest_settings(ingest)
+        self.limit_settings = limit_settings(limits)
+
+    def setup_components(self):
+        self.ingest_accepted, self.ingest_busy = ingest_responses(self.keepalive_settings)
+        self.limits = client_limits(self.limit_settings)
+        self.too_many_requests, self.too_many_connections = limit_responses(
+            self.keepalive_settings, self.limit_settings
+        )
+        self.metrics = ServerMetrics()
+        if self.mode == "static":
+            self.static_files = StaticFiles(self.cache_settings, self.compression_settings, self.static_dir)
+        else:
+            self.static_files = None
+        if self.mode != "static" and self.ingest_settings["enabled"]:
+            self.ingestor = Ingestor(self.port, self.ingest_settings)
+        else:
+            self.ingestor = None
+
+    def start_components(self):
+        if self.static_files is not None:
+            if self.compression_settings["enabled"] and self.compression_settings["precompress"]:
+                start_precompress(self.static_dir, self.compression_settings)
+            self.static_files.start()
+        if self.ingestor is not None:
+            self.ingestor.start()
+
+    def close_components(self):
+        if self.ingestor is not None:
+            self.ingestor.close()
+        if self.static_files is not None:
+            self.static_files.close()
+
+    def cache_stats(self):
+        return self.static_files.stats() if self.static_files is not None else None
+
+    def set_routes(self, routes):
+        # Recarga en caliente: la tabla nueva se compila entera antes de sustituir a la anterior
+        self.route_table = route_table(routes, self.port, self.keepalive_settings)
+        self.routes = list(routes)
+
+class HttpServerThread(ServerOptionsMixin, threading.Thread):
+    def __init__(self, port, message_callback, server_name, mode, static_dir=None,
+                 concurrency="threads", pool_size=DEFAULT_POOL_SIZE, backlog=DEFAULT_BACKLOG, cache=None,
+                 compression=None, keepalive=None, routes=None, ingest=None, limits=None, reuse_port=False):
+        super().__init__()
+        self.setup_options(
+            port, message_callback, server_name, mode, static_dir, concurrency, pool_size, backlog,
+            cache, compression, keepalive, routes, ingest, limits
+        )
+        self.setup_components()
+
+        if mode == "static":
+            handler_class = lambda *args, **kwargs: CustomStaticHandler(*args, directory=static_dir, **kwargs)
+        else:
+            handler_class = CustomSimpleHandler
+
+        if concurrency == "pool":
+            self.httpd = PooledHTTPServer(
+                ('0.0.0.0', port), handler_class, pool_size=pool_size, backlog=backlog, reuse_port=reuse_port
+            )
+        else:
+            self.httpd = BacklogThreadingHTTPServer(
+                ('0.0.0.0', port), handler_class, backlog=backlog, reuse_port=reuse_port
+            )
+        self.httpd.callback = message_callback
+        self.httpd.server_name = server_name
+        self.httpd.static_files = self.static_files
+        self.httpd.keepalive = self.keepalive_settings
+        self.httpd.metrics = self.metrics
+        self.httpd.routes = self.route_table
+        self.httpd.ingest_settings = self.ingest_settings
+        self.httpd.ingestor = self.ingestor
+        self.httpd.ingest_accepted, self.httpd.ingest_busy = self.ingest_accepted, self.ingest_busy
+        self.httpd.limits = self.limits
+        self.httpd.too_many_requests, self.httpd.too_many_connections = (
+            self.too_many_requests, self.too_many_connections
+        )
+        self.daemon = True
+
+    def set_routes(self, routes):
+        super().set_routes(routes)
+        self.httpd.routes = self.route_table
+
+    def start(self):
+        self.start_components()
+        super().start()
+
+    def run(self):
+        try:
+            self.httpd.serve_forever()
+        except Exception:
+            pass
+
+    def stop(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        # Deja de aceptar conexiones y espera hasta `timeout` a las peticiones
+        # en curso. El plazo cuenta desde aquí: shutdown() espera sin límite a
+        # que serve_forever lo vea, así que se pide en otro hilo y se espera
+        # como mucho hasta el mismo plazo
+        deadline = time.monotonic() + timeout
+        if self.is_alive():
+            stopper = threading.Thread(target=self.httpd.shutdown, name=f"http-stop-{self.port}", daemon=True)
+            stopper.start()
+            stopper.join(timeout)
+        self.httpd.server_close()
+        self.httpd.drain(max(0.0, deadline - time.monotonic()))
+        self.close_components()
+
+def server_options(srv):
+    # Argumentos opcionales de create_server a partir de una entrada de config.json
+    return {
+        "concurrency": srv.get("concurrency", "threads"),
+        "pool_size": srv.get("pool_size", DEFAULT_POOL_SIZE),
+        "backlog": srv.get("backlog", DEFAULT_BACKLOG),
+        "cache": srv.get("cache"),
+        "compression": srv.get("compression"),
+        "keepalive": srv.get("keepalive"),
+        "routes": srv.get("routes"),
+        "ingest": srv.get("ingest"),
+        "limits": srv.get("limits"),
+        "processes": srv.get("processes", 1),
+    }
+
+def server_config(server):
+    # Entrada de config.json para un servidor en marcha
+    return {
+        "name": server.server_name,
+        "port": server.port,
+        "mode": server.mode,
+        "static_dir": server.static_dir,
+        "concurrency": server.concurrency,
+        "pool_size": server.pool_size,
+        "backlog": server.backlog,
+        "cache": server.cache_settings,
+        "compression": server.compression_settings,
+        "keepalive": server.keepalive_settings,
+        "routes": server.routes,
+        "ingest": server.ingest_settings,
+        "limits": server.limit_settings,
+        "processes": server.processes,
+    }
+
+def create_server(engine, port, message_callback, server_name, mode, static_dir=None, processes=1, **options):
+    if processes > 1:
+        # Importación diferida: prefork usa create_server dentro de cada proceso
+        from prefork import PreforkServer
+        return PreforkServer(engine, port, message_callback, server_name, mode, static_dir, processes, **options)
+    if engine == "asyncio":
+        # Importación diferida: asyncio solo se carga si se usa este motor
+        from asincrono import AsyncHttpServer
+        return AsyncHttpServer(port, message_callback, server_name, mode, static_dir, **options)
+    if engine != "threaded":
+        raise ValueError(f"Motor de servidor desconocido: {engine}")
+    return HttpServerThread(port, message_callback, server_name, mode, static_dir, **options)